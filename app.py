@@ -1,29 +1,40 @@
 """
 Main Flask application for Biometric Verification System
 """
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from models import db, Employee, BiometricTemplate, AttendanceLog, DuplicateAlert, BenefitClaim, AdminUser
+from models import db, upgrade_schema, Employee, EmployeePhoto, BiometricTemplate, AttendanceLog, DuplicateAlert, BenefitClaim, BackgroundJob, AdminUser
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import datetime, timedelta
+import io
 import os
+import math
 import json
 import uuid
-import base64
 import random
 from werkzeug.utils import secure_filename
+from concurrent.futures import ThreadPoolExecutor
 
 # Import utilities
 from utils.biometric_matcher import (
-    generate_biometric_hash, image_to_hash, detect_duplicate, verify_biometric
+    generate_biometric_hash, image_to_hash, detect_duplicate, _verify_employee,
+    get_embedding_matrix, stack_embeddings, invalidate_embedding, missing_embeddings, parse_embedding,
+    encode_template, decode_image_data, normalize_photo, EMBEDDING_DIM
 )
+from utils.ann_index import face_index
+from utils.kernels import warm_up as warm_up_kernels
 from utils.fraud_detection import (
     detect_ghost_workers, detect_duplicate_claims, detect_unusual_patterns, analyze_employee_risk
 )
-from utils.data_generator import generate_employee, generate_attendance_log, generate_benefit_claim
+from utils.data_generator import generate_employees, generate_attendance_log, generate_benefit_claim
+from utils.json_provider import ORJSON_AVAILABLE, ORJSONProvider
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='public', static_url_path='')
+if ORJSON_AVAILABLE:
+    app.json = ORJSONProvider(app)
 app.secret_key = 'super-secret-key-for-demo-only'  # Change for production
 CORS(app, supports_credentials=True)
 
@@ -49,6 +60,114 @@ db.init_app(app)
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 
+# Single background writer keeps photo file I/O off the request path
+photo_writer = ThreadPoolExecutor(max_workers=1)
+
+# Shard directories already created by the photo writer
+photo_dirs = set()
+
+
+def photo_relpath(photo_sha256):
+    """Sharded path of a photo under the uploads folder: ab/cd/abcd....jpg"""
+    return f"{photo_sha256[:2]}/{photo_sha256[2:4]}/{photo_sha256}.jpg"
+
+
+def write_photo_file(filepath, photo_bytes):
+    """Write a photo to the uploads folder unless it is already there"""
+    try:
+        directory = os.path.dirname(filepath)
+        if directory not in photo_dirs:
+            os.makedirs(directory, exist_ok=True)
+            photo_dirs.add(directory)
+        if not os.path.exists(filepath):
+            with open(filepath, 'wb') as f:
+                f.write(photo_bytes)
+    except Exception as e:
+        print(f"Error saving photo: {e}")
+
+
+# Largest IN (...) list sent to SQLite in one statement
+MAX_QUERY_IDS = 500
+
+
+def encoding_rows(query):
+    """Run a query over Employee encoding columns as get_embedding_matrix input"""
+    return [
+        {'id': row.id, 'biometric_blob': row.biometric_blob}
+        for row in query
+    ]
+
+
+def encoding_query():
+    """Select employee ids with their stored face encodings"""
+    return db.session.query(Employee.id, Employee.biometric_blob)
+
+
+def load_face_index():
+    """
+    Fill the template cache and build or restore the ANN index over active
+    employees' face encodings
+    """
+    rows = encoding_rows(
+        encoding_query().filter(Employee.status == 'active', Employee.biometric_blob.isnot(None))
+    )
+    get_embedding_matrix(rows)
+    # The index holds the stored float32 encodings, so the saved file can be
+    # checked against the database byte for byte
+    embedding_matrix, embedding_ids = stack_embeddings(rows)
+    face_index.load(os.path.join(app.instance_path, 'face_index.bin'), embedding_matrix, embedding_ids)
+
+
+def sync_face_index():
+    """Index encodings that other server processes registered since the last sync"""
+    rows = encoding_rows(encoding_query().filter(
+        Employee.id > face_index.synced_id,
+        Employee.status == 'active',
+        Employee.biometric_blob.isnot(None)
+    ).order_by(Employee.id))
+    if not rows:
+        return
+    unindexed = [row for row in rows if row['id'] not in face_index]
+    if unindexed:
+        embedding_matrix, ids = stack_embeddings(unindexed)
+        face_index.add_items(embedding_matrix, ids)
+    face_index.synced_id = rows[-1]['id']
+
+
+def save_face_index():
+    """Index encodings added by other server processes, then write the index file"""
+    if face_index.loaded:
+        sync_face_index()
+    face_index.save()
+
+
+def cached_encodings(employee_ids):
+    """
+    get_embedding_matrix input for the given employees
+    Stored encodings are only read for employees missing from the cache
+    """
+    employees = {employee_id: {'id': employee_id} for employee_id in employee_ids}
+    missing = missing_embeddings(employee_ids)
+    for start in range(0, len(missing), MAX_QUERY_IDS):
+        for row in encoding_rows(encoding_query().filter(Employee.id.in_(missing[start:start + MAX_QUERY_IDS]))):
+            employees[row['id']] = row
+    return list(employees.values())
+
+
+def preload():
+    """
+    Create the schema and load the encoding cache and ANN index.
+    gunicorn.conf.py runs this in the master before forking, so every worker
+    shares the loaded pages instead of building its own copy.
+    """
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        load_face_index()
+        # Forked workers must open their own SQLite connections
+        db.engine.dispose()
+
+
 @app.route('/')
 def index():
     """Serve the main HTML file"""
@@ -73,17 +192,25 @@ def index():
 @app.route('/api/register', methods=['POST'])
 # @login_required  # Uncomment to enforce login for registration
 def register_employee():
-    """Register a new employee with biometric data"""
+    """
+    Register a new employee with biometric data
+    Accepts multipart/form-data with a 'photo' file, or JSON with base64 'photo_data'
+    """
     try:
-        data = request.json
+        if request.mimetype == 'multipart/form-data':
+            data = request.form.to_dict()
+            photo_file = request.files.get('photo')
+        else:
+            data = request.json
+            photo_file = None
         
         # Validate required fields
         if not data.get('name'):
             return jsonify({'error': 'Name is required'}), 400
         
-        # Check for existing national_id
+        # Check for existing national_id (a single lookup on its unique index)
         if data.get('national_id'):
-            existing = Employee.query.filter_by(national_id=data['national_id']).first()
+            existing = db.session.query(Employee.id).filter_by(national_id=data['national_id']).first()
             if existing:
                 return jsonify({'error': 'National ID already registered'}), 400
         
@@ -93,56 +220,75 @@ def register_employee():
         # Process biometric data
         biometric_hash = None
         photo_path = None
-        
-        if data.get('photo_data'):
-            # Save photo
-            photo_data = data['photo_data']
-            
+        photo_bytes = None
+        
+        # Downscale and re-encode once; the encoder and the file writer
+        # share the resulting JPEG bytes
+        try:
+            if photo_file:
+                photo_bytes = normalize_photo(photo_file.stream)
+            elif data.get('photo_data'):
+                photo_bytes = normalize_photo(io.BytesIO(decode_image_data(data['photo_data'])))
+        except (ValueError, OSError) as e:
+            print(f"Error decoding photo: {e}")
+        
+        if photo_bytes:
             # Generate biometric template (returns JSON string of encoding)
-            photo_hash = image_to_hash(photo_data)
+            photo_hash = image_to_hash(photo_bytes)
             biometric_hash = photo_hash
             
-            # Save photo file
-            try:
-                # Extract base64 data
-                if ',' in photo_data:
-                    photo_data = photo_data.split(',')[1]
-                photo_bytes = base64.b64decode(photo_data)
-                
-                filename = f"{digital_id}.jpg"
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                with open(filepath, 'wb') as f:
-                    f.write(photo_bytes)
-                photo_path = filename
-            except Exception as e:
-                print(f"Error saving photo: {e}")
-        
-        # Check for duplicates
-        existing_employees = Employee.query.filter_by(status='active').all()
-        existing_data = []
-        for emp in existing_employees:
-            emp_data = {
-                'id': emp.id,
-                'name': emp.name,
-                'national_id': emp.national_id,
-                'biometric_hash': emp.biometric_hash
-            }
-            # Load photo data if exists (needed for deep comparison if hash isn't enough)
-            if emp.photo_path:
-                photo_file = os.path.join(app.config['UPLOAD_FOLDER'], emp.photo_path)
-                if os.path.exists(photo_file):
-                    with open(photo_file, 'rb') as f:
-                        emp_data['photo_data'] = base64.b64encode(f.read()).decode()
-            existing_data.append(emp_data)
+            # Photos are stored by content hash; the file copy is written
+            # off the request thread
+            photo_sha256 = generate_biometric_hash(photo_bytes)
+            photo_path = photo_relpath(photo_sha256)
+            photo_writer.submit(
+                write_photo_file,
+                os.path.join(app.config['UPLOAD_FOLDER'], photo_path),
+                photo_bytes
+            )
+        
+        # Check for duplicates. Names are compared against every active
+        # employee; hash-only templates (simulation mode) need the stored
+        # hashes too, face encodings are only read for the candidates below
+        new_embedding = parse_embedding(biometric_hash)
+        if new_embedding is None and biometric_hash:
+            rows = db.session.query(Employee.id, Employee.name, Employee.biometric_hash).filter_by(status='active')
+            existing_data = [{'id': row.id, 'name': row.name, 'biometric_hash': row.biometric_hash} for row in rows]
+        else:
+            rows = db.session.query(Employee.id, Employee.name).filter_by(status='active')
+            existing_data = [{'id': row.id, 'name': row.name} for row in rows]
+        
+        # Encodings come from the in-memory cache, never from the photo files.
+        # With the ANN index only the nearest neighbours are compared.
+        candidate_ids = []
+        if new_embedding is not None:
+            if not face_index.loaded:
+                load_face_index()
+            if face_index.ready:
+                sync_face_index()
+                # 0.36 is face_recognition's 0.6 match tolerance, squared; it
+                # is looser than the duplicate threshold, which is applied later
+                candidate_ids = face_index.query(new_embedding, k=20, max_distance=0.36)
+            else:
+                candidate_ids = [emp['id'] for emp in existing_data]
+        embedding_codes, embedding_scales, embedding_sq_norms, embedding_ids = get_embedding_matrix(
+            cached_encodings(candidate_ids)
+        )
         
+        # national_id is left out: the unique-index lookup above already
+        # rejected any match, so detect_duplicate need not scan for one
         new_data = {
             'name': data['name'],
-            'national_id': data.get('national_id'),
-            'biometric_hash': biometric_hash,
-            'photo_data': data.get('photo_data')
+            'biometric_hash': biometric_hash
         }
         
-        duplicates = detect_duplicate(new_data, existing_data)
+        duplicates = detect_duplicate(
+            new_data, existing_data,
+            embedding_matrix=embedding_codes,
+            embedding_ids=embedding_ids,
+            embedding_scales=embedding_scales,
+            embedding_sq_norms=embedding_sq_norms
+        )
         
         # Create employee record
         employee = Employee(
@@ -154,19 +300,34 @@ def register_employee():
             phone=data.get('phone'),
             email=data.get('email'),
             photo_path=photo_path,
-            biometric_hash=biometric_hash,
+            # Face encodings live only in biometric_blob; biometric_hash keeps
+            # hash-only templates
+            biometric_hash=biometric_hash if new_embedding is None else None,
+            biometric_blob=new_embedding.tobytes() if new_embedding is not None else None,
             created_by=data.get('created_by', 'system')
         )
         
         db.session.add(employee)
         db.session.flush()  # Get employee ID
+        invalidate_embedding(employee.id)
+        
+        if photo_path:
+            # Identical photos share one row; a concurrent upload of the same
+            # photo must not fail the registration on the primary key
+            db.session.execute(sqlite_insert(EmployeePhoto).values(
+                sha256=photo_sha256,
+                employee_id=employee.id,
+                jpeg_bytes=photo_bytes
+            ).on_conflict_do_nothing(index_elements=['sha256']))
         
         # Store biometric templates
-        if data.get('photo_data'):
+        if biometric_hash:
+            template_data, quantization_scale = encode_template(photo_hash)
             template = BiometricTemplate(
                 employee_id=employee.id,
                 template_type='facial',
-                template_data=json.dumps({'hash': photo_hash, 'photo_data': photo_hash}), # Store encoding
+                template_data=template_data,
+                quantization_scale=quantization_scale,
                 quality_score=90.0
             )
             db.session.add(template)
@@ -176,7 +337,7 @@ def register_employee():
             template = BiometricTemplate(
                 employee_id=employee.id,
                 template_type='fingerprint',
-                template_data=json.dumps({'hash': fingerprint_hash}),
+                template_data=encode_template(fingerprint_hash)[0],
                 quality_score=95.0
             )
             db.session.add(template)
@@ -199,6 +360,7 @@ def register_employee():
                 })
         
         db.session.commit()
+        face_index.add(employee.id, new_embedding)
         
         return jsonify({
             'success': True,
@@ -231,22 +393,12 @@ def verify_identity():
         if not employee:
             return jsonify({'error': 'Employee not found'}), 404
         
-        # Get stored templates
-        templates = BiometricTemplate.query.filter_by(employee_id=employee_id).all()
-        
-        verification_result = {'match': False, 'confidence': 0.0}
-        
-        for template in templates:
-            template_data = json.loads(template.template_data)
-            result = verify_biometric(verification_data, template_data)
-            
-            if result['confidence'] > verification_result['confidence']:
-                verification_result = result
+        verified, confidence = _verify_employee(employee, verification_data)
         
         return jsonify({
             'employee': employee.to_dict(),
-            'verified': verification_result['match'],
-            'confidence': verification_result['confidence']
+            'verified': verified,
+            'confidence': confidence
         })
         
     except Exception as e:
@@ -270,14 +422,12 @@ def check_in():
         # Verify biometric if provided
         confidence = 100.0
         if data.get('biometric_data'):
-            verify_result = verify_identity()
-            if hasattr(verify_result, 'json'):
-                verify_data = verify_result.json
-                confidence = verify_data.get('confidence', 100.0)
+            _, confidence = _verify_employee(employee, data['biometric_data'])
         
         # Create attendance log
         log = AttendanceLog(
             employee_id=employee_id,
+            check_in_time=datetime.utcnow(),
             verification_method=verification_method,
             confidence_score=confidence,
             location=data.get('location', 'Main Office'),
@@ -285,6 +435,7 @@ def check_in():
         )
         
         db.session.add(log)
+        employee.last_attendance = log.check_in_time
         db.session.commit()
         
         return jsonify({
@@ -309,16 +460,24 @@ def get_employees():
         per_page = request.args.get('per_page', 50, type=int)
         status = request.args.get('status', 'active')
         
-        query = Employee.query
+        page = max(page, 1)
+        per_page = max(per_page, 1)
+        
+        query = Employee.dict_select()
+        count_query = db.select(db.func.count(Employee.id))
         if status:
-            query = query.filter_by(status=status)
+            query = query.where(Employee.status == status)
+            count_query = count_query.where(Employee.status == status)
         
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        total = db.session.execute(count_query).scalar()
+        rows = db.session.execute(
+            query.order_by(Employee.id).limit(per_page).offset((page - 1) * per_page)
+        ).mappings().all()
         
         return jsonify({
-            'employees': [emp.to_dict() for emp in pagination.items],
-            'total': pagination.total,
-            'pages': pagination.pages,
+            'employees': [Employee.row_to_dict(row) for row in rows],
+            'total': total,
+            'pages': math.ceil(total / per_page),
             'current_page': page
         })
         
@@ -351,6 +510,24 @@ def get_employee(employee_id):
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/employees/<int:employee_id>/photo', methods=['GET'])
+# @login_required
+def get_employee_photo(employee_id):
+    """Serve an employee's photo from its file, falling back to the database"""
+    employee = db.session.get(Employee, employee_id)
+    if not employee or not employee.photo_path:
+        return jsonify({'error': 'Photo not found'}), 404
+    
+    if os.path.isfile(os.path.join(app.config['UPLOAD_FOLDER'], employee.photo_path)):
+        return send_from_directory(app.config['UPLOAD_FOLDER'], employee.photo_path)
+    
+    # The background writer has not written the file yet
+    photo = db.session.get(EmployeePhoto, os.path.splitext(os.path.basename(employee.photo_path))[0])
+    if photo:
+        return Response(photo.jpeg_bytes, mimetype='image/jpeg')
+    return jsonify({'error': 'Photo not found'}), 404
+
+
 # ============= DUPLICATE DETECTION =============
 
 @app.route('/api/duplicates', methods=['GET'])
@@ -360,14 +537,16 @@ def get_duplicates():
     try:
         status = request.args.get('status', 'pending')
         
-        query = DuplicateAlert.query
+        query = DuplicateAlert.dict_select()
         if status:
-            query = query.filter_by(status=status)
+            query = query.where(DuplicateAlert.status == status)
         
-        alerts = query.order_by(DuplicateAlert.similarity_score.desc()).all()
+        rows = db.session.execute(
+            query.order_by(DuplicateAlert.similarity_score.desc())
+        ).mappings().all()
         
         return jsonify({
-            'alerts': [alert.to_dict() for alert in alerts]
+            'alerts': [DuplicateAlert.row_to_dict(row) for row in rows]
         })
         
     except Exception as e:
@@ -381,7 +560,10 @@ def resolve_duplicate(alert_id):
     """Mark duplicate alert as resolved"""
     try:
         data = request.json
-        alert = DuplicateAlert.query.get(alert_id)
+        # to_dict() reads both employees; load them in the same query
+        alert = db.session.get(DuplicateAlert, alert_id, options=[
+            joinedload(DuplicateAlert.employee1), joinedload(DuplicateAlert.employee2)
+        ])
         
         if not alert:
             return jsonify({'error': 'Alert not found'}), 404
@@ -413,10 +595,15 @@ def get_ghost_workers():
     try:
         days_threshold = request.args.get('days', 30, type=int)
         
-        employees = Employee.query.filter_by(status='active').all()
-        attendance_logs = AttendanceLog.query.all()
+        # Only candidates leave the database; the detector adds the reasons
+        cutoff_date = datetime.utcnow() - timedelta(days=days_threshold)
+        employees = Employee.query.filter(
+            Employee.status == 'active',
+            Employee.registration_date < cutoff_date,
+            db.or_(Employee.last_attendance.is_(None), Employee.last_attendance < cutoff_date)
+        ).all()
         
-        ghosts = detect_ghost_workers(employees, attendance_logs, days_threshold)
+        ghosts = detect_ghost_workers(employees, days_threshold=days_threshold)
         
         return jsonify({
             'ghost_workers': [{
@@ -437,8 +624,11 @@ def get_ghost_workers():
 def get_suspicious_claims():
     """Get suspicious benefit claims"""
     try:
-        claims = BenefitClaim.query.all()
-        suspicious = detect_duplicate_claims(claims)
+        # Claim.to_dict() reads the employee name; fetch all employees with one IN query
+        claims = BenefitClaim.query.options(selectinload(BenefitClaim.employee)).order_by(
+            BenefitClaim.employee_id, BenefitClaim.claim_date
+        ).all()
+        suspicious = detect_duplicate_claims(claims, presorted=True)
         
         return jsonify({
             'suspicious_claims': [{
@@ -461,33 +651,43 @@ def get_suspicious_claims():
 def get_dashboard_stats():
     """Get dashboard statistics"""
     try:
-        total_employees = Employee.query.filter_by(status='active').count()
-        total_attendance = AttendanceLog.query.count()
-        pending_duplicates = DuplicateAlert.query.filter_by(status='pending').count()
-        total_claims = BenefitClaim.query.count()
-        
-       # Ghost workers
-        employees = Employee.query.filter_by(status='active').all()
-        attendance_logs = AttendanceLog.query.all()
-        ghosts = detect_ghost_workers(employees, attendance_logs, 30)
+        # Ghost workers: active, registered before the cutoff and no
+        # check-in since (same rule as detect_ghost_workers, in SQL)
+        cutoff_date = datetime.utcnow() - timedelta(days=30)
+        
+        # All counts in a single round-trip
+        (total_employees, total_attendance, pending_duplicates,
+         total_claims, ghost_workers_count) = db.session.query(
+            db.session.query(db.func.count(Employee.id))
+                .filter(Employee.status == 'active').scalar_subquery(),
+            db.session.query(db.func.count(AttendanceLog.id)).scalar_subquery(),
+            db.session.query(db.func.count(DuplicateAlert.id))
+                .filter(DuplicateAlert.status == 'pending').scalar_subquery(),
+            db.session.query(db.func.count(BenefitClaim.id)).scalar_subquery(),
+            db.session.query(db.func.count(Employee.id)).filter(
+                Employee.status == 'active',
+                Employee.registration_date < cutoff_date,
+                db.or_(Employee.last_attendance.is_(None), Employee.last_attendance < cutoff_date)
+            ).scalar_subquery()
+        ).one()
         
         # Recent activity
-        recent_attendance = AttendanceLog.query.order_by(
-            AttendanceLog.check_in_time.desc()
-        ).limit(10).all()
+        recent_attendance = db.session.execute(
+            AttendanceLog.dict_select().order_by(AttendanceLog.check_in_time.desc()).limit(10)
+        ).mappings().all()
         
-        recent_registrations = Employee.query.order_by(
-            Employee.registration_date.desc()
-        ).limit(10).all()
+        recent_registrations = db.session.execute(
+            Employee.dict_select().order_by(Employee.registration_date.desc()).limit(10)
+        ).mappings().all()
         
         return jsonify({
             'total_employees': total_employees,
             'total_attendance': total_attendance,
             'pending_duplicates': pending_duplicates,
             'total_claims': total_claims,
-            'ghost_workers_count': len(ghosts),
-            'recent_attendance': [log.to_dict() for log in recent_attendance],
-            'recent_registrations': [emp.to_dict() for emp in recent_registrations]
+            'ghost_workers_count': ghost_workers_count,
+            'recent_attendance': [AttendanceLog.row_to_dict(row) for row in recent_attendance],
+            'recent_registrations': [Employee.row_to_dict(row) for row in recent_registrations]
         })
         
     except Exception as e:
@@ -497,53 +697,126 @@ def get_dashboard_stats():
 
 # ============= SAMPLE DATA GENERATION =============
 
+# Job status lives in the background_jobs table so any server process can report it
+job_executor = ThreadPoolExecutor(max_workers=2)
+
+
+def generate_sample_data(num_employees):
+    """Bulk-insert sample employees with logs, claims and face encodings"""
+    # Bulk-insert employees, then map the pre-generated digital IDs
+    # back to their row IDs so logs and claims can reference them
+    employees_data, embeddings = generate_employees(num_employees, EMBEDDING_DIM)
+    for emp_data, embedding in zip(employees_data, embeddings):
+        emp_data['biometric_blob'] = embedding.tobytes()
+    
+    db.session.bulk_insert_mappings(Employee, employees_data)
+    
+    digital_ids = [emp_data['digital_id'] for emp_data in employees_data]
+    employees = []
+    for start in range(0, len(digital_ids), MAX_QUERY_IDS):
+        employees.extend(
+            Employee.query.filter(Employee.digital_id.in_(digital_ids[start:start + MAX_QUERY_IDS])).all()
+        )
+    id_by_digital_id = {emp.digital_id: emp.id for emp in employees}
+    
+    templates_data = []
+    logs_data = []
+    claims_data = []
+    last_attendance_data = []
+    start_date = datetime.utcnow() - timedelta(days=60)
+    for emp_data in employees_data:
+        employee_id = id_by_digital_id[emp_data['digital_id']]
+        
+        template_data, quantization_scale = encode_template(emp_data['biometric_blob'])
+        templates_data.append({
+            'employee_id': employee_id,
+            'template_type': 'facial',
+            'template_data': template_data,
+            'quantization_scale': quantization_scale,
+            'quality_score': 90.0
+        })
+        
+        # Generate attendance logs
+        employee_logs = generate_attendance_log(employee_id, start_date, 40)
+        logs_data.extend(employee_logs)
+        if employee_logs:
+            last_attendance_data.append({
+                'id': employee_id,
+                'last_attendance': max(log['check_in_time'] for log in employee_logs)
+            })
+        
+        # Generate some benefit claims
+        for _ in range(random.randint(0, 3)):
+            claims_data.append(generate_benefit_claim(employee_id))
+    
+    db.session.bulk_insert_mappings(BiometricTemplate, templates_data)
+    db.session.bulk_insert_mappings(AttendanceLog, logs_data)
+    db.session.bulk_insert_mappings(BenefitClaim, claims_data)
+    db.session.bulk_update_mappings(Employee, last_attendance_data)
+    db.session.commit()
+    
+    if face_index.loaded:
+        face_index.add_items(embeddings, [id_by_digital_id[emp_data['digital_id']] for emp_data in employees_data])
+    
+    created_employees = [emp.to_dict() for emp in employees]
+    
+    return {
+        'success': True,
+        'employees_created': len(created_employees),
+        'employees': created_employees
+    }
+
+
+def run_sample_data_job(job_id, num_employees):
+    """Run generate_sample_data on a worker thread and record the outcome"""
+    with app.app_context():
+        job = db.session.get(BackgroundJob, job_id)
+        job.status = 'running'
+        db.session.commit()
+        try:
+            result = generate_sample_data(num_employees)
+            job.result = app.json.dumps(result)
+            job.status = 'finished'
+        except Exception as e:
+            db.session.rollback()
+            print(f"Sample data error: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        db.session.commit()
+
+
 @app.route('/api/generate-sample-data', methods=['POST'])
 def create_sample_data():
-    """Generate sample data for testing"""
+    """Queue sample data generation; poll /api/jobs/<job_id> for the result"""
     try:
         num_employees = request.json.get('num_employees', 10)
         
-        created_employees = []
-        
-        for _ in range(num_employees):
-            emp_data = generate_employee()
-            
-            employee = Employee(**emp_data)
-            db.session.add(employee)
-            db.session.flush()
-            
-            # Generate attendance logs
-            logs_data = generate_attendance_log(
-                employee.id,
-                datetime.utcnow() - timedelta(days=60),
-                40
-            )
-            for log_data in logs_data:
-                log = AttendanceLog(**log_data)
-                db.session.add(log)
-            
-            # Generate some benefit claims
-            for _ in range(random.randint(0, 3)):
-                claim_data = generate_benefit_claim(employee.id)
-                claim = BenefitClaim(**claim_data)
-                db.session.add(claim)
-            
-            created_employees.append(employee.to_dict())
-        
+        job_id = uuid.uuid4().hex
+        db.session.add(BackgroundJob(id=job_id, status='queued'))
         db.session.commit()
+        job_executor.submit(run_sample_data_job, job_id, num_employees)
         
         return jsonify({
             'success': True,
-            'employees_created': len(created_employees),
-            'employees': created_employees
-        }), 201
+            'job_id': job_id,
+            'status': 'queued'
+        }), 202
         
     except Exception as e:
-        db.session.rollback()
         print(f"Sample data error: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status (and result, once finished) of a background job"""
+    job = db.session.get(BackgroundJob, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(job.to_dict())
+
+
 # ============= INITIALIZE DATABASE =============
 
 @app.route('/api/init-db', methods=['POST'])
@@ -551,6 +824,7 @@ def init_database():
     """Initialize database tables"""
     try:
         db.create_all()
+        upgrade_schema()
         
         # # Create default admin if not exists
         # if not AdminUser.query.filter_by(username='admin').first():
@@ -565,8 +839,8 @@ def init_database():
 
 
 if __name__ == '__main__':
+    preload()
     with app.app_context():
-        db.create_all()
         # Create default admin if not exists
         if not AdminUser.query.filter_by(username='admin').first():
             print("Creating default admin user...")
@@ -575,5 +849,7 @@ if __name__ == '__main__':
             db.session.add(admin)
             db.session.commit()
             print("Default admin user created successfully.")
-            
+    
+    warm_up_kernels()
+    
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,37 @@
+"""
+Gunicorn settings for running the API in production:
+    gunicorn app:app
+"""
+import multiprocessing
+
+bind = '0.0.0.0:5000'
+workers = 2 * multiprocessing.cpu_count() + 1
+worker_class = 'gthread'
+threads = 4
+
+# Import the app once in the master so the encoding cache and ANN index are
+# loaded a single time and shared copy-on-write with the forked workers
+preload_app = True
+
+
+def when_ready(server):
+    """Runs in the master after the app is imported, before any worker forks"""
+    from app import preload
+    preload()
+
+
+def post_fork(server, worker):
+    """Per-worker setup that cannot be shared across fork"""
+    # The compiled kernels come from numba's on-disk cache, so this only
+    # loads them into each worker before its first request
+    from utils.kernels import warm_up
+    warm_up()
+
+
+def on_exit(server):
+    """Runs in the master at shutdown; only the master writes the ANN index"""
+    # The workers' registrations never reached the master's copy, so read
+    # them back from the database before saving
+    from app import app, save_face_index
+    with app.app_context():
+        save_face_index()
@@ -1,13 +1,83 @@
 """
 Database models for the Biometric Verification System
 """
+import json
+import sqlite3
+import numpy as np
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL so dashboard reads don't block check-in writes"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+# Statements that fill a column the first time it is added to an existing table
+def _backfill_biometric_blob(conn):
+    """Move stored JSON face encodings to raw float32 bytes"""
+    rows = conn.execute(db.text(
+        "SELECT id, biometric_hash FROM employees WHERE biometric_hash LIKE '[%'"
+    )).fetchall()
+    updates = [
+        {'id': row.id, 'blob': np.asarray(json.loads(row.biometric_hash), dtype=np.float32).tobytes()}
+        for row in rows
+    ]
+    if updates:
+        conn.execute(db.text(
+            'UPDATE employees SET biometric_blob = :blob, biometric_hash = NULL WHERE id = :id'
+        ), updates)
+
+
+COLUMN_BACKFILLS = {
+    ('employees', 'last_attendance'): (
+        'UPDATE employees SET last_attendance = ('
+        'SELECT MAX(check_in_time) FROM attendance_logs '
+        'WHERE attendance_logs.employee_id = employees.id)'
+    ),
+    ('employees', 'biometric_blob'): _backfill_biometric_blob,
+}
+
+
+def upgrade_schema():
+    """
+    Bring an existing database up to the declared models
+    create_all only creates missing tables, so add new columns and indexes here
+    """
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                backfill = COLUMN_BACKFILLS.get((table.name, column.name))
+                if callable(backfill):
+                    backfill(conn)
+                elif backfill:
+                    conn.execute(db.text(backfill))
+    
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
 class AdminUser(UserMixin, db.Model):
     """Admin user model"""
     __tablename__ = 'admin_users'
@@ -39,10 +109,12 @@ class Employee(db.Model):
     phone = db.Column(db.String(20))
     email = db.Column(db.String(120))
     photo_path = db.Column(db.String(255))
-    biometric_hash = db.Column(db.Text)
-    registration_date = db.Column(db.DateTime, default=datetime.utcnow)
-    status = db.Column(db.String(20), default='active')
+    biometric_hash = db.Column(db.Text)  # Hash-only templates (simulation mode)
+    biometric_blob = db.Column(db.LargeBinary)  # Face encoding as raw float32 bytes
+    registration_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    status = db.Column(db.String(20), default='active', index=True)
     created_by = db.Column(db.String(100))
+    last_attendance = db.Column(db.DateTime, index=True)  # Latest check_in_time, kept in step by check-in
     
     # Relationships
     biometric_templates = db.relationship('BiometricTemplate', backref='employee', lazy=True, cascade='all, delete-orphan')
@@ -64,6 +136,22 @@ class Employee(db.Model):
             'registration_date': self.registration_date.isoformat() if self.registration_date else None,
             'status': self.status
         }
+    
+    @classmethod
+    def dict_select(cls):
+        """Select the to_dict() fields directly, skipping ORM hydration"""
+        return db.select(
+            cls.id, cls.digital_id, cls.name, cls.national_id, cls.department,
+            cls.position, cls.phone, cls.email, cls.photo_path,
+            cls.registration_date, cls.status
+        )
+    
+    @staticmethod
+    def row_to_dict(row):
+        """Shape a dict_select() row like to_dict()"""
+        data = dict(row)
+        data['registration_date'] = _isoformat(data['registration_date'])
+        return data
 
 
 class BiometricTemplate(db.Model):
@@ -73,7 +161,8 @@ class BiometricTemplate(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
     template_type = db.Column(db.String(20), nullable=False)  # 'fingerprint' or 'facial'
-    template_data = db.Column(db.Text, nullable=False)  # JSON string
+    template_data = db.Column(db.LargeBinary, nullable=False)  # int8 encoding or UTF-8 hash
+    quantization_scale = db.Column(db.Float)  # Set for int8 encodings: encoding = codes / scale
     quality_score = db.Column(db.Float)
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -87,13 +176,23 @@ class BiometricTemplate(db.Model):
         }
 
 
+class EmployeePhoto(db.Model):
+    """Content-addressed photo storage (identical uploads share one row)"""
+    __tablename__ = 'employee_photos'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False, index=True)  # First uploader
+    jpeg_bytes = db.Column(db.LargeBinary, nullable=False)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class AttendanceLog(db.Model):
     """Attendance tracking"""
     __tablename__ = 'attendance_logs'
     
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
-    check_in_time = db.Column(db.DateTime, default=datetime.utcnow)
+    check_in_time = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     verification_method = db.Column(db.String(20))  # 'fingerprint', 'facial', 'id_card'
     confidence_score = db.Column(db.Float)
     location = db.Column(db.String(200))
@@ -109,6 +208,25 @@ class AttendanceLog(db.Model):
             'confidence_score': self.confidence_score,
             'location': self.location
         }
+    
+    @classmethod
+    def dict_select(cls):
+        """Select the to_dict() fields, joining the employee name in the same query"""
+        return db.select(
+            cls.id, cls.employee_id, Employee.name.label('employee_name'),
+            cls.check_in_time, cls.verification_method, cls.confidence_score, cls.location
+        ).outerjoin(Employee, cls.employee_id == Employee.id)
+    
+    @staticmethod
+    def row_to_dict(row):
+        """Shape a dict_select() row like to_dict()"""
+        data = dict(row)
+        data['check_in_time'] = _isoformat(data['check_in_time'])
+        return data
+
+
+# Latest check-in per employee; also serves plain employee_id lookups
+db.Index('ix_attlog_emp_time', AttendanceLog.employee_id, AttendanceLog.check_in_time.desc())
 
 
 class DuplicateAlert(db.Model):
@@ -118,10 +236,10 @@ class DuplicateAlert(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     employee_id_1 = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
     employee_id_2 = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
-    similarity_score = db.Column(db.Float, nullable=False)
+    similarity_score = db.Column(db.Float, nullable=False, index=True)
     matching_factors = db.Column(db.Text)  # JSON array of what matched
     alert_date = db.Column(db.DateTime, default=datetime.utcnow)
-    status = db.Column(db.String(20), default='pending')  # 'pending', 'resolved', 'confirmed_duplicate'
+    status = db.Column(db.String(20), default='pending', index=True)  # 'pending', 'resolved', 'confirmed_duplicate'
     investigation_notes = db.Column(db.Text)
     resolved_by = db.Column(db.String(100))
     resolved_date = db.Column(db.DateTime)
@@ -143,6 +261,27 @@ class DuplicateAlert(db.Model):
             'status': self.status,
             'investigation_notes': self.investigation_notes
         }
+    
+    @classmethod
+    def dict_select(cls):
+        """Select the to_dict() fields, joining both employee names in the same query"""
+        employee1 = db.aliased(Employee)
+        employee2 = db.aliased(Employee)
+        return db.select(
+            cls.id, cls.employee_id_1, cls.employee_id_2,
+            employee1.name.label('employee_1_name'), employee2.name.label('employee_2_name'),
+            cls.similarity_score, cls.matching_factors, cls.alert_date,
+            cls.status, cls.investigation_notes
+        ).outerjoin(employee1, cls.employee_id_1 == employee1.id).outerjoin(
+            employee2, cls.employee_id_2 == employee2.id
+        )
+    
+    @staticmethod
+    def row_to_dict(row):
+        """Shape a dict_select() row like to_dict()"""
+        data = dict(row)
+        data['alert_date'] = _isoformat(data['alert_date'])
+        return data
 
 
 class BenefitClaim(db.Model):
@@ -150,7 +289,7 @@ class BenefitClaim(db.Model):
     __tablename__ = 'benefit_claims'
     
     id = db.Column(db.Integer, primary_key=True)
-    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False, index=True)
     benefit_type = db.Column(db.String(100), nullable=False)
     amount = db.Column(db.Float)
     claim_date = db.Column(db.DateTime, default=datetime.utcnow)
@@ -171,3 +310,26 @@ class BenefitClaim(db.Model):
             'verified_by_biometric': self.verified_by_biometric,
             'payment_date': self.payment_date.isoformat() if self.payment_date else None
         }
+
+
+# Claims in (employee_id, claim_date) order for detect_duplicate_claims
+db.Index('ix_claim_emp_date', BenefitClaim.employee_id, BenefitClaim.claim_date)
+
+
+class BackgroundJob(db.Model):
+    """Status of a background job, shared by every server process"""
+    __tablename__ = 'background_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    status = db.Column(db.String(20), default='queued')  # queued, running, finished, failed
+    result = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        data = {'job_id': self.id, 'status': self.status}
+        if self.result is not None:
+            data['result'] = json.loads(self.result)
+        if self.error is not None:
+            data['error'] = self.error
+        return data
@@ -213,11 +213,20 @@ elements.generateDataBtn.addEventListener('click', async () => {
     btn.disabled = true;
 
     try {
-        await fetch(`${API_URL}/generate-sample-data`, {
+        const response = await fetch(`${API_URL}/generate-sample-data`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ num_employees: 5 })
         });
+        const { job_id } = await response.json();
+
+        // Generation runs in the background; wait for the job to finish
+        let job;
+        do {
+            await new Promise(resolve => setTimeout(resolve, 500));
+            job = await (await fetch(`${API_URL}/jobs/${job_id}`)).json();
+        } while (job.status === 'queued' || job.status === 'running');
+        if (job.status !== 'finished') throw new Error(job.error);
 
         // Refresh dashboard
         await loadDashboardData();
@@ -257,21 +266,19 @@ elements.photoUpload.addEventListener('change', (e) => {
 elements.regForm.addEventListener('submit', async (e) => {
     e.preventDefault();
     const formData = new FormData(elements.regForm);
-    const data = Object.fromEntries(formData.entries());
 
-    // Add photo data if exists
-    if (elements.photoPreview.src) {
-        data.photo_data = elements.photoPreview.src;
+    // Upload the photo file as-is (multipart), not as base64 JSON
+    if (elements.photoUpload.files[0]) {
+        formData.append('photo', elements.photoUpload.files[0]);
     }
 
     // Simulate fingerprint
-    data.fingerprint_data = 'simulated_fingerprint_' + Date.now();
+    formData.append('fingerprint_data', 'simulated_fingerprint_' + Date.now());
 
     try {
         const response = await fetch(`${API_URL}/register`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(data)
+            body: formData
         });
 
         const result = await response.json();
@@ -0,0 +1,278 @@
+"""
+Equivalence checks for the array-based fraud detection
+Each check compares against the original per-record datetime loops
+Run with: python -m unittest discover tests
+"""
+import random
+import unittest
+from collections import defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from utils import fraud_detection
+
+NOW = datetime(2025, 3, 14, 15, 9, 26, 535897)
+
+
+class FixedDatetime(datetime):
+    """datetime whose utcnow() is pinned, so both sides see the same clock"""
+
+    @classmethod
+    def utcnow(cls):
+        return NOW
+
+
+# ----- Original implementations -----
+
+def reference_ghost_workers(employees, attendance_logs, days_threshold, now):
+    ghost_workers = []
+    attendance_map = defaultdict(list)
+    for log in attendance_logs:
+        attendance_map[log.employee_id].append(log)
+
+    cutoff_date = now - timedelta(days=days_threshold)
+    for employee in employees:
+        # The original raised on a missing registration date; those are skipped now
+        if employee.status != 'active' or employee.registration_date is None:
+            continue
+        attendances = attendance_map.get(employee.id, [])
+        if employee.registration_date < cutoff_date:
+            if not attendances:
+                ghost_workers.append({
+                    'employee': employee,
+                    'reason': 'No attendance records',
+                    'days_since_registration': (now - employee.registration_date).days
+                })
+            else:
+                last_attendance = max(attendances, key=lambda x: x.check_in_time)
+                if last_attendance.check_in_time < cutoff_date:
+                    ghost_workers.append({
+                        'employee': employee,
+                        'reason': f'No attendance in {days_threshold} days',
+                        'last_attendance': last_attendance.check_in_time,
+                        'days_since_attendance': (now - last_attendance.check_in_time).days
+                    })
+    return ghost_workers
+
+
+def reference_last_check_ins(attendance_logs):
+    last = {}
+    for log in attendance_logs:
+        if log.employee_id not in last or log.check_in_time > last[log.employee_id]:
+            last[log.employee_id] = log.check_in_time
+    return last
+
+
+def reference_duplicate_claims(benefit_claims, time_window_hours):
+    suspicious_claims = []
+    claims_by_employee = defaultdict(list)
+    for claim in benefit_claims:
+        claims_by_employee[claim.employee_id].append(claim)
+
+    for employee_id, claims in claims_by_employee.items():
+        claims = sorted(claims, key=lambda x: x.claim_date)
+        for i in range(len(claims) - 1):
+            hours_diff = (claims[i + 1].claim_date - claims[i].claim_date).total_seconds() / 3600
+            if hours_diff < time_window_hours:
+                suspicious_claims.append({
+                    'employee_id': employee_id,
+                    'claims': [claims[i], claims[i + 1]],
+                    'time_difference_hours': hours_diff,
+                    'reason': f'Multiple claims within {time_window_hours} hours'
+                })
+    return suspicious_claims
+
+
+def reference_unusual_patterns(attendance_logs):
+    unusual_patterns = []
+    for log in attendance_logs:
+        check_in = log.check_in_time
+        if check_in.weekday() >= 5:
+            unusual_patterns.append({'type': 'weekend_checkin', 'log': log, 'reason': 'Check-in on weekend'})
+        if check_in.hour < 5:
+            unusual_patterns.append({
+                'type': 'unusual_hour',
+                'log': log,
+                'reason': f'Check-in at unusual hour: {check_in.hour}:00'
+            })
+        if log.confidence_score and log.confidence_score < 70:
+            unusual_patterns.append({
+                'type': 'low_confidence',
+                'log': log,
+                'reason': f'Low verification confidence: {log.confidence_score}%'
+            })
+    return unusual_patterns
+
+
+def reference_employee_risk(employee, attendance_logs, benefit_claims, duplicates, now):
+    risk_score = 0
+    risk_factors = []
+
+    employee_duplicates = [d for d in duplicates if
+                           d.employee_id_1 == employee.id or d.employee_id_2 == employee.id]
+    pending_duplicates = [d for d in employee_duplicates if d.status == 'pending']
+    if pending_duplicates:
+        risk_score += 40
+        risk_factors.append(f'{len(pending_duplicates)} pending duplicate alerts')
+
+    employee_attendance = [log for log in attendance_logs if log.employee_id == employee.id]
+    if len(employee_attendance) == 0 and employee.status == 'active' and employee.registration_date is not None:
+        days_since_reg = (now - employee.registration_date).days
+        if days_since_reg > 7:
+            risk_score += 30
+            risk_factors.append(f'No attendance in {days_since_reg} days')
+
+    employee_claims = [claim for claim in benefit_claims if claim.employee_id == employee.id]
+    unverified_claims = [c for c in employee_claims if not c.verified_by_biometric]
+    if unverified_claims:
+        risk_score += 20
+        risk_factors.append(f'{len(unverified_claims)} unverified benefit claims')
+    if len(employee_claims) > 5:
+        risk_score += 10
+        risk_factors.append(f'High number of benefit claims ({len(employee_claims)})')
+
+    risk_level = 'low'
+    if risk_score >= 70:
+        risk_level = 'critical'
+    elif risk_score >= 40:
+        risk_level = 'high'
+    elif risk_score >= 20:
+        risk_level = 'medium'
+
+    return {
+        'employee_id': employee.id,
+        'risk_score': min(100, risk_score),
+        'risk_level': risk_level,
+        'risk_factors': risk_factors
+    }
+
+
+# ----- Random records -----
+
+def random_time(rng, days_back):
+    """A timestamp up to days_back days before NOW, with microseconds"""
+    return NOW - timedelta(days=rng.uniform(0, days_back), microseconds=rng.randrange(1_000_000))
+
+
+def random_records(seed, num_employees=300):
+    rng = random.Random(seed)
+    employees = [
+        SimpleNamespace(
+            id=employee_id,
+            status=rng.choice(['active', 'active', 'active', 'inactive']),
+            registration_date=None if rng.random() < 0.05 else random_time(rng, 120),
+            last_attendance=None
+        )
+        for employee_id in range(1, num_employees + 1)
+    ]
+    # Active employees no log can reach, with and without a registration date
+    employees += [
+        SimpleNamespace(id=num_employees + 100, status='active', registration_date=None, last_attendance=None),
+        SimpleNamespace(id=num_employees + 101, status='active', registration_date=random_time(rng, 120),
+                        last_attendance=None),
+    ]
+    # Some employees never check in; ids past num_employees have no employee row
+    logs = [
+        SimpleNamespace(
+            employee_id=rng.randrange(1, num_employees + 20),
+            check_in_time=random_time(rng, 90),
+            confidence_score=rng.choice([None, 0, rng.uniform(40, 100)])
+        )
+        for _ in range(rng.randrange(1, 3 * num_employees))
+    ]
+    # Logs before the epoch exercise the datetime64 weekday and hour arithmetic
+    logs += [
+        SimpleNamespace(
+            employee_id=rng.randrange(1, num_employees),
+            check_in_time=datetime(1969, 12, 28) + timedelta(seconds=rng.randrange(8 * 86400)),
+            confidence_score=None
+        )
+        for _ in range(50)
+    ]
+    last_check_ins = reference_last_check_ins(logs)
+    for employee in employees:
+        employee.last_attendance = last_check_ins.get(employee.id)
+
+    claims = []
+    for _ in range(rng.randrange(1, 2 * num_employees)):
+        claim_date = random_time(rng, 30)
+        claims.append(SimpleNamespace(
+            employee_id=rng.randrange(1, num_employees),
+            claim_date=claim_date,
+            verified_by_biometric=rng.random() < 0.5
+        ))
+        if rng.random() < 0.3:
+            # A second claim close behind, sometimes at the exact same instant
+            claims.append(SimpleNamespace(
+                employee_id=claims[-1].employee_id,
+                claim_date=claim_date + timedelta(hours=rng.choice([0, rng.uniform(0, 48)])),
+                verified_by_biometric=True
+            ))
+    duplicates = [
+        SimpleNamespace(
+            employee_id_1=rng.randrange(1, num_employees),
+            employee_id_2=rng.randrange(1, num_employees),
+            status=rng.choice(['pending', 'resolved'])
+        )
+        for _ in range(num_employees // 5)
+    ]
+    return employees, logs, claims, duplicates
+
+
+class FraudDetectionTest(unittest.TestCase):
+    """The NumPy rewrites must return exactly what the datetime loops returned"""
+
+    SEEDS = range(10)
+
+    def setUp(self):
+        patcher = mock.patch.object(fraud_detection, 'datetime', FixedDatetime)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_last_check_ins(self):
+        for seed in self.SEEDS:
+            _, logs, _, _ = random_records(seed)
+            self.assertEqual(fraud_detection._last_check_ins(logs), reference_last_check_ins(logs))
+        self.assertEqual(fraud_detection._last_check_ins([]), {})
+
+    def test_ghost_workers(self):
+        for seed in self.SEEDS:
+            employees, logs, _, _ = random_records(seed)
+            for days_threshold in (1, 7, 30, 60):
+                expected = reference_ghost_workers(employees, logs, days_threshold, NOW)
+                self.assertEqual(fraud_detection.detect_ghost_workers(employees, logs, days_threshold), expected)
+                # The denormalized last_attendance column gives the same answer
+                self.assertEqual(fraud_detection.detect_ghost_workers(employees, None, days_threshold), expected)
+
+    def test_duplicate_claims(self):
+        for seed in self.SEEDS:
+            _, _, claims, _ = random_records(seed)
+            for window in (1, 24, 36.5):
+                expected = reference_duplicate_claims(claims, window)
+                # Employees come out in id order instead of first-seen order
+                expected.sort(key=lambda suspicious: suspicious['employee_id'])
+                self.assertEqual(fraud_detection.detect_duplicate_claims(claims, window), expected)
+
+                presorted = sorted(claims, key=lambda claim: (claim.employee_id, claim.claim_date))
+                self.assertEqual(fraud_detection.detect_duplicate_claims(presorted, window, presorted=True), expected)
+
+    def test_unusual_patterns(self):
+        for seed in self.SEEDS:
+            _, logs, _, _ = random_records(seed)
+            self.assertEqual(fraud_detection.detect_unusual_patterns(logs), reference_unusual_patterns(logs))
+        self.assertEqual(fraud_detection.detect_unusual_patterns([]), [])
+
+    def test_employee_risk(self):
+        for seed in self.SEEDS:
+            employees, logs, claims, duplicates = random_records(seed, num_employees=60)
+            expected = [reference_employee_risk(emp, logs, claims, duplicates, NOW) for emp in employees]
+            self.assertEqual(fraud_detection.analyze_all_risks(employees, logs, claims, duplicates), expected)
+            self.assertEqual(
+                [fraud_detection.analyze_employee_risk(emp, logs, claims, duplicates) for emp in employees],
+                expected
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
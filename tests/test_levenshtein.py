@@ -0,0 +1,107 @@
+"""
+Equivalence checks for the bit-parallel Levenshtein fallback
+Run with: python -m unittest discover tests
+"""
+import random
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from utils import biometric_matcher
+
+
+def reference_distance(s1, s2):
+    """Textbook dynamic-programming Levenshtein distance"""
+    previous = list(range(len(s2) + 1))
+    for i, c1 in enumerate(s1, 1):
+        current = [i]
+        for j, c2 in enumerate(s2, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (c1 != c2)
+            ))
+        previous = current
+    return previous[-1]
+
+
+def reference_similarity(name1, name2):
+    """calculate_name_similarity computed with the reference distance"""
+    name1 = name1.lower().strip()
+    name2 = name2.lower().strip()
+    if name1 == name2:
+        return 100.0
+    max_len = max(len(name1), len(name2))
+    if min(len(name1), len(name2)) == 0:
+        return 0.0
+    return ((max_len - reference_distance(name1, name2)) / max_len) * 100
+
+
+def random_string(rng, alphabet, max_length):
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length)))
+
+
+class LevenshteinDistanceTest(unittest.TestCase):
+    """_levenshtein_distance must agree with the reference DP exactly"""
+
+    def check_pairs(self, alphabet, max_length, count, seed):
+        rng = random.Random(seed)
+        for _ in range(count):
+            s1 = random_string(rng, alphabet, max_length)
+            s2 = random_string(rng, alphabet, max_length)
+            self.assertEqual(
+                biometric_matcher._levenshtein_distance(s1, s2),
+                reference_distance(s1, s2),
+                (s1, s2)
+            )
+
+    def test_small_alphabet(self):
+        # Few distinct characters exercise long runs of matches
+        self.check_pairs('ab', 12, 5000, seed=1)
+
+    def test_names(self):
+        self.check_pairs('abcdeijkmnorstuw -', 20, 5000, seed=2)
+
+    def test_long_strings(self):
+        # Longer than 64 characters, past a single machine word
+        self.check_pairs('abcd', 150, 300, seed=3)
+
+    def test_unicode(self):
+        self.check_pairs('aäbcçéñø', 16, 2000, seed=4)
+
+    def test_edge_cases(self):
+        for s1, s2 in [('', ''), ('', 'abc'), ('abc', ''), ('a', 'a'), ('abc', 'abc'), ('kitten', 'sitting')]:
+            self.assertEqual(biometric_matcher._levenshtein_distance(s1, s2), reference_distance(s1, s2))
+
+    def test_matcher_reused_across_names(self):
+        # The cached matcher for one query name must not carry state between calls
+        rng = random.Random(5)
+        query = 'wanjiru otieno'
+        for _ in range(2000):
+            other = random_string(rng, 'wanjiruotieo ', 18)
+            self.assertEqual(biometric_matcher._levenshtein_distance(query, other), reference_distance(query, other))
+
+
+class NameSimilaritiesFallbackTest(unittest.TestCase):
+    """name_similarities without rapidfuzz must match the reference scores"""
+
+    def test_batch_matches_reference(self):
+        rng = random.Random(6)
+        alphabet = 'abcdeijkmnorstuw '
+        with mock.patch.object(biometric_matcher, 'RAPIDFUZZ_AVAILABLE', False):
+            for _ in range(200):
+                name = random_string(rng, alphabet, 16)
+                names = [random_string(rng, alphabet, 16) for _ in range(25)]
+                expected = np.array([reference_similarity(name, other) for other in names])
+                np.testing.assert_allclose(biometric_matcher.name_similarities(name, names), expected)
+
+                # Names the length bound skips score 0; every other score is unchanged
+                pruned = biometric_matcher.name_similarities(name, names, min_similarity=80)
+                kept = expected > 80
+                np.testing.assert_allclose(pruned[kept], expected[kept])
+                self.assertTrue(np.all(pruned[~kept] <= 80))
+
+
+if __name__ == '__main__':
+    unittest.main()
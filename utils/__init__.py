@@ -3,34 +3,78 @@ Utility package initialization
 """
 from .biometric_matcher import (
     generate_biometric_hash,
+    decode_image_data,
+    normalize_photo,
     image_to_hash,
+    image_to_hash_batch,
+    image_to_hash_parallel,
     calculate_image_similarity,
     detect_duplicate,
-    verify_biometric
+    verify_biometric,
+    verify_templates,
+    batch_verify,
+    parse_embedding,
+    parse_phash,
+    phash_similarity,
+    quantize_embedding,
+    dequantize_embedding,
+    quantized_similarities,
+    encode_template,
+    decode_template,
+    get_embedding_matrix,
+    stack_embeddings,
+    embedding_similarities,
+    invalidate_embedding,
+    missing_embeddings,
+    name_similarities
 )
 from .fraud_detection import (
     detect_ghost_workers,
     detect_duplicate_claims,
     detect_unusual_patterns,
-    analyze_employee_risk
+    analyze_employee_risk,
+    analyze_all_risks
 )
 from .data_generator import (
     generate_employee,
+    generate_employees,
     generate_attendance_log,
     generate_benefit_claim
 )
 
 __all__ = [
     'generate_biometric_hash',
+    'decode_image_data',
+    'normalize_photo',
     'image_to_hash',
+    'image_to_hash_batch',
+    'image_to_hash_parallel',
     'calculate_image_similarity',
     'detect_duplicate',
     'verify_biometric',
+    'verify_templates',
+    'batch_verify',
+    'parse_embedding',
+    'parse_phash',
+    'phash_similarity',
+    'quantize_embedding',
+    'dequantize_embedding',
+    'quantized_similarities',
+    'encode_template',
+    'decode_template',
+    'get_embedding_matrix',
+    'stack_embeddings',
+    'embedding_similarities',
+    'invalidate_embedding',
+    'missing_embeddings',
+    'name_similarities',
     'detect_ghost_workers',
     'detect_duplicate_claims',
     'detect_unusual_patterns',
     'analyze_employee_risk',
+    'analyze_all_risks',
     'generate_employee',
+    'generate_employees',
     'generate_attendance_log',
     'generate_benefit_claim'
 ]
@@ -0,0 +1,232 @@
+"""
+Approximate nearest-neighbour index over stored face encodings
+"""
+import os
+import atexit
+import hashlib
+import threading
+import numpy as np
+
+# Try to import hnswlib, fallback to FAISS or a linear scan if not installed
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+# Try to import faiss, used for exact SIMD search when hnswlib is missing
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+if not HNSWLIB_AVAILABLE and not FAISS_AVAILABLE:
+    print("Warning: hnswlib and faiss libraries not found. Duplicate checks will scan every encoding.")
+
+
+class EmbeddingIndex:
+    """
+    Nearest-neighbour index over face encodings, labelled by employee id
+
+    Uses an HNSW graph from hnswlib when installed, otherwise an exact FAISS
+    index over float16 encodings. Both use squared L2 distance so candidates
+    are ranked exactly like calculate_image_similarity ranks them.
+    """
+
+    def __init__(self, max_elements=1024, ef_construction=200, M=16, ef=64):
+        self.max_elements = max_elements
+        self.ef_construction = ef_construction
+        self.M = M
+        self.ef = ef
+        self.path = None
+        self.index = None
+        self.loaded = False
+        # Highest employee id read from the database; rows above it may have
+        # been registered by another server process
+        self.synced_id = 0
+        # Employee id -> SHA-256 of the indexed encoding, to tell whether a
+        # saved index still matches the database
+        self._digests = {}
+        self._owner_pid = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        """True when an index backend is installed"""
+        return HNSWLIB_AVAILABLE or FAISS_AVAILABLE
+
+    @property
+    def ready(self):
+        """True when the index can answer queries"""
+        return self.index is not None and self._count() > 0
+
+    def __contains__(self, employee_id):
+        return employee_id in self._digests
+
+    @staticmethod
+    def _digests_of(embedding_matrix, employee_ids):
+        return {
+            employee_id: hashlib.sha256(np.ascontiguousarray(row, dtype=np.float32).tobytes()).digest()
+            for employee_id, row in zip(employee_ids, embedding_matrix)
+        }
+
+    @staticmethod
+    def _fingerprint(digests):
+        """Hash of every (id, encoding) pair, independent of insertion order"""
+        fingerprint = hashlib.sha256()
+        for employee_id in sorted(digests):
+            fingerprint.update(int(employee_id).to_bytes(8, 'little', signed=True))
+            fingerprint.update(digests[employee_id])
+        return fingerprint.hexdigest()
+
+    @staticmethod
+    def _read_fingerprint(path):
+        try:
+            with open(f'{path}.sha256') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _count(self):
+        if HNSWLIB_AVAILABLE:
+            return self.index.get_current_count()
+        return self.index.ntotal
+
+    def _create(self, dim, capacity):
+        if HNSWLIB_AVAILABLE:
+            index = hnswlib.Index(space='l2', dim=dim)
+            index.init_index(max_elements=capacity, ef_construction=self.ef_construction, M=self.M)
+            index.set_ef(self.ef)
+            return index
+        # Exact search over float16 copies: half the memory and bandwidth of
+        # float32, far below the precision the match threshold needs
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2))
+
+    def _read(self, path, dim, capacity):
+        """Load a saved index; returns (index, ids it holds)"""
+        if HNSWLIB_AVAILABLE:
+            index = hnswlib.Index(space='l2', dim=dim)
+            index.load_index(path, max_elements=capacity)
+            index.set_ef(self.ef)
+            return index, index.get_ids_list()
+        index = faiss.read_index(path)
+        return index, faiss.vector_to_array(index.id_map).tolist()
+
+    def _add(self, embedding_matrix, employee_ids):
+        ids = np.asarray(employee_ids, dtype=np.int64)
+        if HNSWLIB_AVAILABLE:
+            needed = self.index.get_current_count() + len(ids)
+            if needed > self.index.get_max_elements():
+                self.index.resize_index(max(needed, 2 * self.index.get_max_elements()))
+            self.index.add_items(embedding_matrix, ids)
+            return
+        # IndexIDMap2 keeps duplicate ids, so drop the old encodings first
+        replaced = [employee_id for employee_id in employee_ids if employee_id in self._digests]
+        if replaced:
+            self.index.remove_ids(np.asarray(replaced, dtype=np.int64))
+        self.index.add_with_ids(np.ascontiguousarray(embedding_matrix, dtype=np.float32), ids)
+
+    def load(self, path, embedding_matrix, embedding_ids):
+        """
+        Restore the index from disk, rebuilding it from the given encodings
+        when the file is missing or out of step with the database
+        """
+        self.path = path
+        self.loaded = True
+        self._owner_pid = os.getpid()
+        self.synced_id = max(embedding_ids, default=0)
+        if not self.available or not embedding_ids:
+            return
+
+        dim = embedding_matrix.shape[1]
+        capacity = max(self.max_elements, 2 * len(embedding_ids))
+        digests = self._digests_of(embedding_matrix, embedding_ids)
+
+        with self._lock:
+            if path and os.path.exists(path):
+                try:
+                    # Matching ids are not enough: a recreated database
+                    # reuses ids 1..N for different encodings
+                    if self._read_fingerprint(path) == self._fingerprint(digests):
+                        index, ids = self._read(path, dim, capacity)
+                        if sorted(ids) == sorted(embedding_ids):
+                            self.index = index
+                            self._digests = digests
+                            return
+                    print("Face index does not match the database, rebuilding it")
+                except Exception as e:
+                    print(f"Error loading face index: {e}")
+
+            self.index = self._create(dim, capacity)
+            self._digests = {}
+            self._add(embedding_matrix, embedding_ids)
+            self._digests = digests
+            self._dirty = True
+
+    def add(self, employee_id, embedding):
+        """Insert or replace one employee's encoding"""
+        if embedding is None:
+            return
+        self.add_items(embedding.reshape(1, -1), [employee_id])
+
+    def add_items(self, embedding_matrix, employee_ids):
+        """Insert or replace the encodings of several employees"""
+        if not self.available or not employee_ids:
+            return
+
+        with self._lock:
+            if self.index is None:
+                capacity = max(self.max_elements, 2 * len(employee_ids))
+                self.index = self._create(embedding_matrix.shape[1], capacity)
+            self._add(embedding_matrix, employee_ids)
+            self._digests.update(self._digests_of(embedding_matrix, employee_ids))
+            self._dirty = True
+
+    def query(self, embedding, k=10, max_distance=None):
+        """
+        Find the employees whose encodings are closest to the given one
+        max_distance drops neighbours further away (squared L2)
+        Returns: list of employee ids, nearest first
+        """
+        query = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            k = min(k, self._count())
+            if HNSWLIB_AVAILABLE:
+                labels, distances = self.index.knn_query(query, k=k)
+            else:
+                distances, labels = self.index.search(query, k)
+
+        return [
+            int(label) for label, distance in zip(labels[0], distances[0])
+            if label >= 0 and (max_distance is None or distance <= max_distance)
+        ]
+
+    def save(self):
+        """
+        Persist the index next to the database if it changed
+        Only the process that loaded the index writes it, so forked server
+        workers never overwrite each other's files
+        """
+        with self._lock:
+            if os.getpid() != self._owner_pid:
+                return
+            if self._dirty and self.path and self.index is not None:
+                # Write a temporary file and swap it in, so a crash mid-write
+                # never leaves a truncated index behind
+                temp_path = f'{self.path}.{os.getpid()}.tmp'
+                if HNSWLIB_AVAILABLE:
+                    self.index.save_index(temp_path)
+                else:
+                    faiss.write_index(self.index, temp_path)
+                os.replace(temp_path, self.path)
+                with open(temp_path, 'w') as f:
+                    f.write(self._fingerprint(self._digests))
+                os.replace(temp_path, f'{self.path}.sha256')
+                self._dirty = False
+
+
+# Shared index used by the registration endpoint
+face_index = EmbeddingIndex()
+atexit.register(face_index.save)
@@ -5,8 +5,15 @@ import hashlib
 import json
 from PIL import Image
 import io
+import os
 import base64
+import functools
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+from .kernels import NUMBA_AVAILABLE, row_distances, int8_dots, paired_distances
 
 # Try to import face_recognition, fallback if not installed
 try:
@@ -16,21 +23,64 @@ except ImportError:
     FACE_RECOGNITION_AVAILABLE = False
     print("Warning: face_recognition library not found. Using simulation mode.")
 
-def generate_biometric_hash(data_string):
-    """Generate a secure hash for biometric data"""
-    return hashlib.sha256(data_string.encode()).hexdigest()
+# Try to import service_streamer, fallback to unbatched verification
+try:
+    from service_streamer import ThreadedStreamer
+    SERVICE_STREAMER_AVAILABLE = True
+except ImportError:
+    SERVICE_STREAMER_AVAILABLE = False
+
+# Try to import rapidfuzz, fallback to the pure-Python Levenshtein distance
+try:
+    from rapidfuzz.distance import Levenshtein
+    from rapidfuzz.process import cdist
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
+# face_recognition encodings are 128 float32 values
+EMBEDDING_DIM = 128
+
+# Registration photos are downscaled to fit this box before encoding and storage
+MAX_PHOTO_SIZE = (320, 320)
+
+# Simulation-mode templates are 64x64 average hashes, packed 8 bits per byte
+# and base64 encoded
+PHASH_SIZE = (64, 64)
+PHASH_BYTES = PHASH_SIZE[0] * PHASH_SIZE[1] // 8
+
+def generate_biometric_hash(data):
+    """Generate a secure hash for biometric data (str or bytes)"""
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.sha256(data).hexdigest()
+
+def decode_image_data(image_data):
+    """Decode a base64 image (optionally a data: URL) into raw bytes"""
+    if ',' in image_data:
+        image_data = image_data.split(',')[1]
+    return base64.b64decode(image_data)
+
+def normalize_photo(stream):
+    """
+    Downscale a photo to MAX_PHOTO_SIZE and re-encode it as JPEG (quality 85)
+    Returns: JPEG bytes
+    """
+    img = Image.open(stream)
+    img.thumbnail(MAX_PHOTO_SIZE)
+    out = io.BytesIO()
+    img.convert('RGB').save(out, format='JPEG', quality=85)
+    return out.getvalue()
 
 def image_to_hash(image_data):
     """
     Convert image to a biometric template
+    Accepts raw image bytes or a base64 string
     Returns: JSON string of encoding or hash
     """
     try:
         if isinstance(image_data, str):
-            # Base64 encoded image
-            if ',' in image_data:
-                image_data = image_data.split(',')[1]
-            image_bytes = base64.b64decode(image_data)
+            image_bytes = decode_image_data(image_data)
         else:
             image_bytes = image_data
         
@@ -50,16 +100,79 @@ def image_to_hash(image_data):
         else:
             # Fallback to simulation hash
             img = Image.open(io.BytesIO(image_bytes))
-            img = img.resize((64, 64)).convert('L')
-            pixels = list(img.getdata())
-            avg = sum(pixels) / len(pixels)
-            bits = ''.join('1' if p > avg else '0' for p in pixels)
-            return hashlib.sha256(bits.encode()).hexdigest()
+            # Let the JPEG decoder produce a downscaled greyscale image directly
+            # (DCT scaling), then resize one channel instead of three
+            img.draft('L', PHASH_SIZE)
+            img = img.convert('L').resize(PHASH_SIZE)
+            pixels = np.asarray(img)
+            # Keep the bits themselves so templates can be compared by Hamming distance
+            bits = np.packbits(pixels > pixels.mean())
+            return base64.b64encode(bits.tobytes()).decode()
             
     except Exception as e:
         print(f"Error processing image: {e}")
         return None
 
+def image_to_hash_batch(images, batch_size=128):
+    """
+    Convert several images to biometric templates
+    Accepts raw image bytes or base64 strings
+    
+    With face_recognition, faces are located by the CNN detector in batches
+    (on the GPU when dlib is built with CUDA). A batch must share one image
+    shape, so images are grouped by size first.
+    Returns: list of templates in input order, None where no face was found
+    """
+    if not FACE_RECOGNITION_AVAILABLE:
+        return [image_to_hash(image_data) for image_data in images]
+    
+    arrays = [None] * len(images)
+    by_shape = {}
+    for i, image_data in enumerate(images):
+        try:
+            if isinstance(image_data, str):
+                image_data = decode_image_data(image_data)
+            arrays[i] = face_recognition.load_image_file(io.BytesIO(image_data))
+        except Exception as e:
+            print(f"Error processing image: {e}")
+            continue
+        by_shape.setdefault(arrays[i].shape, []).append(i)
+    
+    templates = [None] * len(images)
+    for indices in by_shape.values():
+        for start in range(0, len(indices), batch_size):
+            batch = indices[start:start + batch_size]
+            locations = face_recognition.batch_face_locations(
+                [arrays[i] for i in batch],
+                number_of_times_to_upsample=0,
+                batch_size=len(batch)
+            )
+            for i, face_locations in zip(batch, locations):
+                if not face_locations:
+                    print("No face detected in image")
+                    continue
+                # Encode only the first face, as image_to_hash does
+                encodings = face_recognition.face_encodings(arrays[i], known_face_locations=face_locations[:1])
+                templates[i] = json.dumps(encodings[0].tolist())
+    
+    return templates
+
+def image_to_hash_parallel(images, workers=None):
+    """
+    Convert several images to biometric templates on a pool of processes
+    For CPU-only deployments; with a GPU prefer image_to_hash_batch
+    Returns: list of templates in input order, None where encoding failed
+    """
+    workers = min(workers or os.cpu_count() or 1, len(images))
+    if workers <= 1:
+        return [image_to_hash(image_data) for image_data in images]
+    
+    # Spawned workers import this module (and face_recognition's models) once
+    # each; forking a server process that already runs threads is unsafe
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        return list(executor.map(image_to_hash, images, chunksize=4))
+
 def calculate_image_similarity(template1, template2):
     """
     Calculate similarity between two biometric templates
@@ -71,9 +184,9 @@ def calculate_image_similarity(template1, template2):
             
         if FACE_RECOGNITION_AVAILABLE:
             try:
-                # Parse encodings
-                enc1 = np.array(json.loads(template1))
-                enc2 = np.array(json.loads(template2))
+                # Parse encodings (raw float32 blobs skip JSON entirely)
+                enc1 = parse_embedding(template1)
+                enc2 = parse_embedding(template2)
                 
                 # Calculate Euclidean distance
                 # face_recognition uses distance < 0.6 as a match
@@ -90,7 +203,13 @@ def calculate_image_similarity(template1, template2):
                 # Fallback if templates aren't valid JSON arrays (legacy data)
                 return 0.0
         else:
-            # Simulation: simple string comparison of hashes
+            # Simulation: share of matching perceptual-hash bits
+            bits1 = parse_phash(template1)
+            bits2 = parse_phash(template2)
+            if bits1 is not None and bits2 is not None:
+                return phash_similarity(bits1, bits2)
+            
+            # Legacy SHA-256 templates can only be compared for equality
             if template1 == template2:
                 return 100.0
             return 0.0
@@ -99,92 +218,450 @@ def calculate_image_similarity(template1, template2):
         print(f"Error calculating similarity: {e}")
         return 0.0
 
+def parse_phash(template):
+    """
+    Decode a simulation-mode perceptual-hash template
+    Returns: packed bits as a uint8 array, or None for other templates
+    """
+    if not isinstance(template, str) or len(template) != 4 * -(-PHASH_BYTES // 3):
+        return None
+    try:
+        bits = base64.b64decode(template, validate=True)
+    except ValueError:
+        return None
+    return np.frombuffer(bits, dtype=np.uint8)
+
+def phash_similarity(bits1, bits2):
+    """Percentage of matching bits between two packed perceptual hashes"""
+    # XOR, then a single popcount over the whole 4096-bit difference
+    differing = int.from_bytes(np.bitwise_xor(bits1, bits2).tobytes(), 'big').bit_count()
+    return (1.0 - differing / (8 * len(bits1))) * 100
+
+def parse_embedding(template):
+    """
+    Decode a stored biometric template into a float32 vector
+    Accepts a JSON list or raw float32 bytes (Employee.biometric_blob)
+    Returns None for hash-only templates (simulation mode, fingerprints)
+    """
+    if not template:
+        return None
+    if isinstance(template, (bytes, memoryview)):
+        if len(template) != EMBEDDING_DIM * 4:
+            return None
+        return np.frombuffer(template, dtype=np.float32)
+    try:
+        values = json.loads(template)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(values, list) or not values:
+        return None
+    return np.asarray(values, dtype=np.float32)
+
+def quantize_embedding(embedding):
+    """
+    Quantize an encoding to int8 with a symmetric per-vector scale
+    Returns: (codes, scale) where embedding ~= codes / scale
+    """
+    peak = float(np.max(np.abs(embedding)))
+    scale = 127.0 / peak if peak > 0 else 1.0
+    codes = np.round(embedding * scale).astype(np.int8)
+    return codes, scale
+
+def dequantize_embedding(codes, scale):
+    """Recover float32 encodings from int8 codes (one scale per row)"""
+    return codes.astype(np.float32) / np.asarray(scale, dtype=np.float32)[..., None]
+
+def encode_template(template):
+    """
+    Pack a biometric template for storage
+    Encodings become int8 codes plus a scale, hashes are stored as UTF-8
+    Returns: (data, scale) where scale is None for hash-only templates
+    """
+    embedding = parse_embedding(template)
+    if embedding is not None:
+        codes, scale = quantize_embedding(embedding)
+        return codes.tobytes(), scale
+    return template.encode(), None
+
+def decode_template(data, scale=None):
+    """
+    Unpack a stored biometric template
+    Returns: float32 encoding, or the hash string for hash-only templates
+    """
+    if isinstance(data, str):
+        # Legacy rows hold JSON such as {"hash": ...}
+        template = json.loads(data).get('hash')
+        embedding = parse_embedding(template)
+        return embedding if embedding is not None else template
+    if scale is not None:
+        return dequantize_embedding(np.frombuffer(data, dtype=np.int8), scale)
+    if len(data) == EMBEDDING_DIM * 4:
+        return np.frombuffer(data, dtype=np.float32)
+    return data.decode()
+
+class _TemplateCache:
+    """
+    int8-quantized face encodings keyed by employee id
+    
+    Each entry is (codes, scale, sq_norm) where sq_norm is ||codes / scale||^2,
+    or None when the employee has no face encoding. Entries are filled lazily
+    from the stored templates so duplicate checks never re-parse JSON or
+    re-read photos, and the scan streams a quarter of the bytes.
+    """
+    
+    def __init__(self):
+        self._entries = {}
+    
+    def get(self, employee_id, template):
+        """Cached entry for an employee, quantizing the template on first use"""
+        if employee_id not in self._entries:
+            embedding = parse_embedding(template)
+            entry = None
+            if embedding is not None:
+                codes, scale = quantize_embedding(embedding)
+                sq_norm = int(np.einsum('i,i->', codes, codes, dtype=np.int32)) / scale ** 2
+                entry = (codes, scale, sq_norm)
+            self._entries[employee_id] = entry
+        return self._entries[employee_id]
+    
+    def invalidate(self, employee_id):
+        self._entries.pop(employee_id, None)
+    
+    def missing(self, employee_ids):
+        """Ids that have no cached entry yet"""
+        return [employee_id for employee_id in employee_ids if employee_id not in self._entries]
+    
+    def matrix(self, employees):
+        """
+        Stack the encodings of the given employees as one row per employee,
+        with scales and squared norms as parallel arrays
+        Returns: (codes, scales, sq_norms, ids) where row i belongs to employee ids[i]
+        """
+        ids = []
+        rows = []
+        scales = []
+        sq_norms = []
+        for emp in employees:
+            entry = self.get(emp['id'], emp.get('biometric_blob') or emp.get('biometric_hash'))
+            if entry is not None:
+                ids.append(emp['id'])
+                rows.append(entry[0])
+                scales.append(entry[1])
+                sq_norms.append(entry[2])
+        
+        if not rows:
+            empty = np.empty(0, dtype=np.float32)
+            return np.empty((0, 0), dtype=np.int8), empty, empty, ids
+        return (
+            np.vstack(rows),
+            np.asarray(scales, dtype=np.float32),
+            np.asarray(sq_norms, dtype=np.float32),
+            ids
+        )
+
+_template_cache = _TemplateCache()
+
+def get_embedding_matrix(employees):
+    """
+    Stack the cached int8 encodings of the given employees into an (N, D) matrix
+    Returns: (codes, scales, sq_norms, ids) where row i belongs to employee ids[i]
+    """
+    return _template_cache.matrix(employees)
+
+def stack_embeddings(employees):
+    """
+    Stack the stored float32 encodings of the given employees, unquantized
+    Returns: ((N, D) float32 matrix, ids) where row i belongs to employee ids[i]
+    """
+    ids = []
+    rows = []
+    for emp in employees:
+        embedding = parse_embedding(emp.get('biometric_blob'))
+        if embedding is not None:
+            ids.append(emp['id'])
+            rows.append(embedding)
+    if not rows:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32), ids
+    return np.vstack(rows), ids
+
+def invalidate_embedding(employee_id):
+    """Drop a cached encoding after the employee's biometrics change"""
+    _template_cache.invalidate(employee_id)
+
+def missing_embeddings(employee_ids):
+    """Ids whose stored templates still have to be read for get_embedding_matrix"""
+    return _template_cache.missing(employee_ids)
+
+def embedding_similarities(matrix, embedding, sq_norms=None):
+    """
+    Similarity of one encoding against every row of an (N, D) matrix
+    sq_norms optionally holds the precomputed ||row||^2 values
+    Returns: float32 array of percentages (0-100), same scale as
+    calculate_image_similarity
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    query = np.asarray(embedding, dtype=np.float32)
+    
+    if NUMBA_AVAILABLE and sq_norms is None:
+        distances = row_distances(matrix, query)
+    else:
+        # ||e - q||^2 = ||e||^2 - 2 e.q + ||q||^2, so the whole scan is one matvec
+        if sq_norms is None:
+            sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+        sq_distances = sq_norms - 2 * (matrix @ query) + query @ query
+        distances = np.sqrt(np.maximum(sq_distances, 0))
+    
+    return np.clip((1.0 - distances) * 100, 0, 100)
+
+def quantized_similarities(codes, scales, embedding, sq_norms=None):
+    """
+    Similarity of one encoding against an int8-quantized (N, D) matrix
+    sq_norms optionally holds the precomputed ||codes / scale||^2 values
+    Returns: float32 array of percentages (0-100)
+    """
+    query_codes, query_scale = quantize_embedding(np.asarray(embedding, dtype=np.float32))
+    
+    # Expand ||e - q||^2 around integer dot products so the scan only
+    # streams int8 codes; accumulation is int32 to avoid overflow
+    if NUMBA_AVAILABLE:
+        dots = int8_dots(codes, query_codes)
+    else:
+        dots = np.einsum('ij,j->i', codes, query_codes, dtype=np.int32)
+    if sq_norms is None:
+        sq_norms = np.einsum('ij,ij->i', codes, codes, dtype=np.int32) / scales ** 2
+    query_sq_norm = int(np.einsum('i,i->', query_codes, query_codes, dtype=np.int32))
+    
+    sq_distances = (
+        sq_norms
+        - 2 * dots / (scales * query_scale)
+        + query_sq_norm / query_scale ** 2
+    )
+    distances = np.sqrt(np.maximum(sq_distances, 0)).astype(np.float32)
+    
+    return np.clip((1.0 - distances) * 100, 0, 100)
+
 def calculate_name_similarity(name1, name2):
     """
     Calculate name similarity using Levenshtein distance
     Returns similarity percentage
     """
-    name1 = name1.lower().strip()
-    name2 = name2.lower().strip()
+    name1 = _normalize_name(name1)
+    name2 = _normalize_name(name2)
     
     if name1 == name2:
         return 100.0
     
-    # Simple Levenshtein distance
     len1, len2 = len(name1), len(name2)
     if len1 == 0 or len2 == 0:
         return 0.0
     
-    matrix = [[0] * (len2 + 1) for _ in range(len1 + 1)]
-    
-    for i in range(len1 + 1):
-        matrix[i][0] = i
-    for j in range(len2 + 1):
-        matrix[0][j] = j
-    
-    for i in range(1, len1 + 1):
-        for j in range(1, len2 + 1):
-            cost = 0 if name1[i-1] == name2[j-1] else 1
-            matrix[i][j] = min(
-                matrix[i-1][j] + 1,      # deletion
-                matrix[i][j-1] + 1,      # insertion
-                matrix[i-1][j-1] + cost  # substitution
-            )
-    
-    distance = matrix[len1][len2]
+    if RAPIDFUZZ_AVAILABLE:
+        distance = Levenshtein.distance(name1, name2)
+    else:
+        distance = _levenshtein_distance(name1, name2)
     max_len = max(len1, len2)
     similarity = ((max_len - distance) / max_len) * 100
     
     return similarity
 
-def detect_duplicate(new_employee_data, existing_employees):
+def _normalize_name(name):
+    return name.lower().strip()
+
+def _levenshtein_distance(name1, name2):
+    """Levenshtein distance with Myers' bit-parallel algorithm"""
+    return _levenshtein_matcher(name1)(name2)
+
+@functools.lru_cache(maxsize=256)
+def _levenshtein_matcher(name1):
     """
-    Detect potential duplicates by comparing with existing employees
+    Build a distance function specialized for one fixed name1
+    
+    Uses Myers' bit-parallel algorithm: each DP column is held as bit vectors
+    in a Python int (bit i is row i of name1), so a whole column is updated
+    with a few AND/OR/XOR operations per character of name2. Everything that
+    depends only on name1 (the match masks and bit constants) is computed
+    once here, so scoring one name against many others pays for it once.
     """
-    duplicates = []
+    length = len(name1)
+    if length == 0:
+        return len
     
-    for existing in existing_employees:
-        matching_factors = []
-        scores = []
-        
-        # Check national ID (exact match)
-        if new_employee_data.get('national_id') and existing.get('national_id'):
-            if new_employee_data['national_id'] == existing['national_id']:
-                matching_factors.append('national_id')
-                scores.append(100.0)
-        
-        # Check name similarity
-        if new_employee_data.get('name') and existing.get('name'):
-            name_sim = calculate_name_similarity(new_employee_data['name'], existing['name'])
-            if name_sim > 80:  # 80% threshold
-                matching_factors.append('name')
-                scores.append(name_sim)
+    # peq[c] has bit i set where name1[i] == c
+    peq = {}
+    for i, char in enumerate(name1):
+        peq[char] = peq.get(char, 0) | (1 << i)
+    
+    def distance(name2, peq_get=peq.get, mask=(1 << length) - 1, last=1 << (length - 1)):
+        vp = mask  # vertical +1 deltas
+        vn = 0     # vertical -1 deltas
+        result = length
         
-        # Check biometric similarity
-        if new_employee_data.get('biometric_hash') and existing.get('biometric_hash'):
-            bio_sim = calculate_image_similarity(
-                new_employee_data['biometric_hash'], 
-                existing['biometric_hash']
-            )
+        for char in name2:
+            eq = peq_get(char, 0)
+            xv = eq | vn
+            xh = (((eq & vp) + vp) ^ vp) | eq
+            hp = vn | ~(xh | vp)
+            hn = vp & xh
             
-            # Threshold depends on method
-            threshold = 85.0 if FACE_RECOGNITION_AVAILABLE else 99.0
+            # The last row of the column is the running distance
+            if hp & last:
+                result += 1
+            elif hn & last:
+                result -= 1
             
-            if bio_sim > threshold:
-                matching_factors.append('facial_recognition')
-                scores.append(bio_sim)
+            hp = (hp << 1) | 1
+            vp = ((hn << 1) | ~(xv | hp)) & mask
+            vn = hp & xv
         
-        # If any factors matched, add to duplicates
-        if matching_factors:
-            overall_score = sum(scores) / len(scores)
-            duplicates.append({
-                'employee': existing,
-                'similarity_score': overall_score,
-                'matching_factors': matching_factors
-            })
-    
-    # Sort by similarity score (highest first)
-    duplicates.sort(key=lambda x: x['similarity_score'], reverse=True)
+        return result
+    
+    return distance
+
+def name_similarities(name, names, min_similarity=None):
+    """
+    Similarity of one name against a list of names, as calculate_name_similarity
+    With min_similarity, names whose length alone keeps them at or below it
+    are not compared and score 0 (the edit distance is at least the
+    difference in length)
+    Returns: float64 array of percentages (0-100)
+    """
+    similarities = np.zeros(len(names), dtype=np.float64)
+    if not names:
+        return similarities
+    
+    name = _normalize_name(name)
+    normalized = [_normalize_name(other) for other in names]
+    lengths = np.fromiter(map(len, normalized), dtype=np.int64, count=len(normalized))
+    max_lens = np.maximum(len(name), lengths)
+    
+    candidates = np.arange(len(names))
+    if min_similarity is not None:
+        # Best score each name could reach, computed with the same formula
+        # so the bound is exact in floating point
+        with np.errstate(divide='ignore', invalid='ignore'):
+            best = (max_lens - np.abs(lengths - len(name))) / max_lens * 100
+        candidates = np.flatnonzero((max_lens == 0) | (best > min_similarity))
+    if not len(candidates):
+        return similarities
+    
+    if not RAPIDFUZZ_AVAILABLE:
+        # One distance function specialized for the query name serves every candidate
+        distance = _levenshtein_matcher(name)
+        for i in candidates:
+            other = normalized[i]
+            if other == name:
+                similarities[i] = 100.0
+            elif other and name:
+                max_len = max_lens[i]
+                similarities[i] = ((max_len - distance(other)) / max_len) * 100
+        return similarities
+    
+    # All candidate edit distances in one C++ call
+    distances = cdist([name], [normalized[i] for i in candidates], scorer=Levenshtein.distance, workers=-1)[0]
+    
+    candidate_max_lens = max_lens[candidates]
+    scores = np.zeros(len(candidates), dtype=np.float64)
+    np.divide(candidate_max_lens - distances, candidate_max_lens, out=scores, where=candidate_max_lens > 0)
+    scores *= 100
+    # Two empty names are identical, as in calculate_name_similarity
+    scores[candidate_max_lens == 0] = 100.0
+    similarities[candidates] = scores
+    return similarities
+
+def detect_duplicate(new_employee_data, existing_employees, embedding_matrix=None, embedding_ids=None,
+                     embedding_scales=None, embedding_sq_norms=None, limit=None):
+    """
+    Detect potential duplicates by comparing with existing employees
+    
+    embedding_matrix/embedding_ids are the stacked cached encodings from
+    get_embedding_matrix; when omitted they are built from existing_employees.
+    Pass embedding_scales when the matrix holds int8 codes, and
+    embedding_sq_norms to skip recomputing the row norms. limit keeps only
+    the highest-scoring matches.
+    """
+    count = len(existing_employees)
+    threshold = 85.0 if FACE_RECOGNITION_AVAILABLE else 99.0
+    
+    # One score array per factor, aligned with existing_employees
+    national_id_hits = np.zeros(count, dtype=bool)
+    name_scores = np.zeros(count, dtype=np.float64)
+    bio_scores = np.zeros(count, dtype=np.float64)
+    
+    # Check national ID (exact match); callers that hold a unique index on
+    # national_id can leave it out of new_employee_data to skip this scan
+    national_id = new_employee_data.get('national_id')
+    if national_id:
+        national_id_hits = np.fromiter(
+            (existing.get('national_id') == national_id for existing in existing_employees),
+            dtype=bool, count=count
+        )
+    
+    # Score the new name against every existing name in one batch
+    if new_employee_data.get('name'):
+        named = [i for i, existing in enumerate(existing_employees) if existing.get('name')]
+        name_scores[named] = name_similarities(
+            new_employee_data['name'], [existing_employees[i]['name'] for i in named], min_similarity=80
+        )
+    
+    # Score the new encoding against every cached row in one pass
+    new_template = new_employee_data.get('biometric_hash')
+    new_embedding = parse_embedding(new_template)
+    if new_embedding is not None:
+        if embedding_matrix is None:
+            embedding_matrix, embedding_scales, embedding_sq_norms, embedding_ids = get_embedding_matrix(
+                existing_employees
+            )
+        if embedding_ids:
+            if embedding_scales is not None:
+                similarities = quantized_similarities(
+                    embedding_matrix, embedding_scales, new_embedding, embedding_sq_norms
+                )
+            else:
+                similarities = embedding_similarities(embedding_matrix, new_embedding, embedding_sq_norms)
+            row_of = {existing.get('id'): i for i, existing in enumerate(existing_employees)}
+            for i in np.flatnonzero(similarities > threshold):
+                row = row_of.get(embedding_ids[i])
+                if row is not None:
+                    bio_scores[row] = similarities[i]
+    elif new_template:
+        for i, existing in enumerate(existing_employees):
+            if existing.get('biometric_hash'):
+                bio_scores[i] = calculate_image_similarity(new_template, existing['biometric_hash'])
+    
+    name_hits = name_scores > 80  # 80% threshold
+    bio_hits = bio_scores > threshold  # Threshold depends on method
+    
+    # Overall score is the mean over the matched factors
+    factor_counts = national_id_hits.astype(np.int64) + name_hits + bio_hits
+    matched = np.flatnonzero(factor_counts)
+    overall = (
+        100.0 * national_id_hits[matched]
+        + np.where(name_hits[matched], name_scores[matched], 0.0)
+        + np.where(bio_hits[matched], bio_scores[matched], 0.0)
+    ) / factor_counts[matched]
+    
+    # Highest similarity first; partial sort when only the top few are wanted
+    if limit is not None and limit < len(matched):
+        top = np.argpartition(-overall, limit - 1)[:limit]
+        order = top[np.argsort(-overall[top], kind='stable')]
+    else:
+        order = np.argsort(-overall, kind='stable')
+    
+    duplicates = []
+    for position in order:
+        i = matched[position]
+        matching_factors = []
+        if national_id_hits[i]:
+            matching_factors.append('national_id')
+        if name_hits[i]:
+            matching_factors.append('name')
+        if bio_hits[i]:
+            matching_factors.append('facial_recognition')
+        duplicates.append({
+            'employee': existing_employees[i],
+            'similarity_score': float(overall[position]),
+            'matching_factors': matching_factors
+        })
     
     return duplicates
 
@@ -202,9 +679,15 @@ def verify_biometric(submitted_data, stored_template):
         
         elif submitted_data.get('type') == 'facial':
             # Compare facial features
-            if submitted_data.get('photo_data') and stored_template.get('hash'):
-                # Convert submitted photo to template
-                submitted_template = image_to_hash(submitted_data['photo_data'])
+            if (submitted_data.get('photo_data') or submitted_data.get('encoding') is not None) \
+                    and stored_template.get('hash'):
+                # Use the client's encoding if sent, else convert the photo to a template
+                if submitted_data.get('encoding') is not None:
+                    encoding = _submitted_encoding(submitted_data)
+                    submitted_template = encoding.tobytes() if encoding is not None else None
+                else:
+                    # Normalized like registration photos, as verify_templates does
+                    submitted_template = _photo_template(decode_image_data(submitted_data['photo_data']))
                 
                 if submitted_template:
                     similarity = calculate_image_similarity(
@@ -221,3 +704,147 @@ def verify_biometric(submitted_data, stored_template):
     except Exception as e:
         print(f"Error verifying biometric: {e}")
         return {'match': False, 'confidence': 0.0}
+
+def batch_verify(pairs):
+    """
+    Compare (submitted, stored) encoding pairs in one vectorised pass
+    Returns: list of similarity percentages, one per pair
+    """
+    queries = np.vstack([query for query, _ in pairs]).astype(np.float32)
+    templates = np.vstack([template for _, template in pairs]).astype(np.float32)
+    
+    if NUMBA_AVAILABLE:
+        distances = paired_distances(queries, templates)
+    else:
+        diffs = queries - templates
+        distances = np.sqrt(np.einsum('bd,bd->b', diffs, diffs))
+    
+    return np.clip((1.0 - distances) * 100, 0, 100).tolist()
+
+# Coalesces encoding comparisons from concurrent verify requests into batches.
+# Created on first use so a forked server worker starts its own batching
+# thread instead of inheriting the parent's dead one.
+_verify_streamer = None
+_verify_streamer_pid = None
+
+def _get_verify_streamer():
+    """Return this process's verify streamer, or None without service_streamer"""
+    global _verify_streamer, _verify_streamer_pid
+    if not SERVICE_STREAMER_AVAILABLE:
+        return None
+    if _verify_streamer_pid != os.getpid():
+        _verify_streamer = ThreadedStreamer(batch_verify, batch_size=64, max_latency=0.01)
+        _verify_streamer_pid = os.getpid()
+    return _verify_streamer
+
+# Templates of recently verified photos keyed by the SHA-256 of the upload,
+# so an identical photo submitted again skips decoding and face encoding
+_PHOTO_TEMPLATES = OrderedDict()
+_PHOTO_TEMPLATES_MAX = 1024
+_photo_templates_lock = threading.Lock()
+
+def _photo_template(photo_bytes):
+    """
+    image_to_hash of an uploaded photo, normalized the same way registration
+    photos are; results are kept in a small LRU keyed by content hash
+    Raises ValueError/OSError when the photo cannot be decoded
+    """
+    digest = generate_biometric_hash(photo_bytes)
+    with _photo_templates_lock:
+        if digest in _PHOTO_TEMPLATES:
+            _PHOTO_TEMPLATES.move_to_end(digest)
+            return _PHOTO_TEMPLATES[digest]
+    
+    template = image_to_hash(normalize_photo(io.BytesIO(photo_bytes)))
+    
+    with _photo_templates_lock:
+        _PHOTO_TEMPLATES[digest] = template
+        if len(_PHOTO_TEMPLATES) > _PHOTO_TEMPLATES_MAX:
+            _PHOTO_TEMPLATES.popitem(last=False)
+    return template
+
+def _submitted_encoding(submitted_data):
+    """
+    Client-computed face encoding from a facial payload ({'encoding': [...]})
+    Returns: float32 vector, or None when absent, malformed or not finite
+    """
+    encoding = submitted_data.get('encoding')
+    if encoding is None:
+        return None
+    try:
+        values = np.asarray(encoding, dtype=np.float32)
+    except (TypeError, ValueError):
+        return None
+    if values.shape != (EMBEDDING_DIM,) or not np.isfinite(values).all():
+        return None
+    return values
+
+def verify_templates(submitted_data, stored_templates):
+    """
+    Verify submitted biometric data against all of an employee's stored templates
+    stored_templates are values returned by decode_template
+    A facial payload may carry a precomputed 'encoding' instead of 'photo_data'
+    Returns the best match found
+    """
+    best_result = {'match': False, 'confidence': 0.0}
+    
+    if submitted_data.get('type') == 'facial' and (
+            submitted_data.get('encoding') is not None or submitted_data.get('photo_data')):
+        # Encode the submitted photo once, not once per stored template
+        if submitted_data.get('encoding') is not None:
+            query = _submitted_encoding(submitted_data)
+            if query is None:
+                return best_result
+            # Raw float32 bytes, which parse_embedding reads without JSON
+            submitted_template = query.tobytes()
+        else:
+            try:
+                submitted_template = _photo_template(decode_image_data(submitted_data['photo_data']))
+            except (ValueError, OSError) as e:
+                print(f"Error decoding photo: {e}")
+                return best_result
+            if not submitted_template:
+                return best_result
+            query = parse_embedding(submitted_template)
+        scores = []
+        pairs = []
+        for template in stored_templates:
+            if isinstance(template, np.ndarray):
+                if query is not None and template.shape == query.shape:
+                    pairs.append((query, template))
+            elif template:
+                scores.append(calculate_image_similarity(submitted_template, template))
+        
+        if pairs:
+            streamer = _get_verify_streamer()
+            if streamer is not None:
+                scores.extend(streamer.predict(pairs))
+            else:
+                scores.extend(batch_verify(pairs))
+        
+        if scores:
+            confidence = float(max(scores))
+            threshold = 85.0 if FACE_RECOGNITION_AVAILABLE else 99.0
+            best_result = {'match': confidence > threshold, 'confidence': confidence}
+        return best_result
+    
+    for template in stored_templates:
+        if not isinstance(template, str):
+            continue
+        result = verify_biometric(submitted_data, {'hash': template})
+        if result['confidence'] > best_result['confidence']:
+            best_result = result
+    
+    return best_result
+
+def _verify_employee(employee, biometric_data):
+    """
+    Verify biometric data against every template stored for an employee
+    Returns: (match, confidence)
+    """
+    templates = [
+        decode_template(template.template_data, template.quantization_scale)
+        for template in employee.biometric_templates
+    ]
+    result = verify_templates(biometric_data, templates)
+    return result['match'], result['confidence']
@@ -4,6 +4,7 @@ Generate sample data for testing
 import random
 from datetime import datetime, timedelta
 import uuid
+import numpy as np
 
 
 FIRST_NAMES = [
@@ -74,6 +75,23 @@ def generate_employee():
     }
 
 
+def generate_employees(n, embedding_dim=128):
+    """
+    Generate n random employees with synthetic face encodings
+    
+    Returns:
+        (list of employee dicts, (n, embedding_dim) float32 array of
+        L2-normalized encodings, row i belonging to employee i)
+    """
+    employees = [generate_employee() for _ in range(n)]
+    
+    # One allocation and one normalization for the whole batch
+    embeddings = np.random.default_rng().standard_normal((n, embedding_dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    
+    return employees, embeddings
+
+
 def generate_attendance_log(employee_id, start_date, num_days):
     """Generate attendance logs for an employee"""
     logs = []
@@ -3,15 +3,47 @@ Fraud detection utilities
 """
 from datetime import datetime, timedelta
 from collections import defaultdict
+import numpy as np
+from .kernels import NAT, ghost_flags
 
+# Timestamps are handled as int64 microseconds since the epoch
+US_PER_SECOND = 1_000_000
+US_PER_DAY = 86_400 * US_PER_SECOND
 
-def detect_ghost_workers(employees, attendance_logs, days_threshold=30):
+
+def _last_check_ins(attendance_logs):
+    """Latest check-in time per employee id, as a group-by max over arrays"""
+    if not attendance_logs:
+        return {}
+    
+    employee_ids = np.fromiter((log.employee_id for log in attendance_logs), dtype=np.int64,
+                               count=len(attendance_logs))
+    check_ins = np.array([log.check_in_time for log in attendance_logs], dtype='datetime64[us]')
+    
+    unique_ids, groups = np.unique(employee_ids, return_inverse=True)
+    last = np.full(len(unique_ids), check_ins.min())
+    np.maximum.at(last, groups, check_ins)
+    
+    return dict(zip(unique_ids.tolist(), last.astype(object)))
+
+
+def _days_since_registration(employees, now):
+    """Whole days since each employee registered, or None when unknown"""
+    registered = np.array(
+        [employee.registration_date for employee in employees], dtype='datetime64[us]'
+    ).astype(np.int64)
+    days = (np.datetime64(now, 'us').astype(np.int64) - registered) // US_PER_DAY
+    return [None if reg == NAT else day for reg, day in zip(registered.tolist(), days.tolist())]
+
+
+def detect_ghost_workers(employees, attendance_logs=None, days_threshold=30):
     """
     Identify potential ghost workers (registered but never attend)
     
     Args:
         employees: list of employee records
-        attendance_logs: list of attendance records
+        attendance_logs: list of attendance records, or None to use each
+            employee's denormalized last_attendance
         days_threshold: number of days of no attendance to flag as ghost
     
     Returns:
@@ -19,76 +51,89 @@ def detect_ghost_workers(employees, attendance_logs, days_threshold=30):
     """
     ghost_workers = []
     
-    # Create attendance map
-    attendance_map = defaultdict(list)
-    for log in attendance_logs:
-        attendance_map[log.employee_id].append(log)
+    # Create last-attendance map
+    if attendance_logs is None:
+        last_attendance_map = {employee.id: employee.last_attendance for employee in employees}
+    else:
+        last_attendance_map = _last_check_ins(attendance_logs)
     
-    cutoff_date = datetime.utcnow() - timedelta(days=days_threshold)
+    now = datetime.utcnow()
+    cutoff_date = now - timedelta(days=days_threshold)
     
-    for employee in employees:
-        if employee.status != 'active':
-            continue
-        
-        attendances = attendance_map.get(employee.id, [])
-        
-        # Check if registered before cutoff
-        if employee.registration_date < cutoff_date:
-            # Check if no attendance or old attendance
-            if not attendances:
-                ghost_workers.append({
-                    'employee': employee,
-                    'reason': 'No attendance records',
-                    'days_since_registration': (datetime.utcnow() - employee.registration_date).days
-                })
-            else:
-                # Check last attendance
-                last_attendance = max(attendances, key=lambda x: x.check_in_time)
-                if last_attendance.check_in_time < cutoff_date:
-                    ghost_workers.append({
-                        'employee': employee,
-                        'reason': f'No attendance in {days_threshold} days',
-                        'last_attendance': last_attendance.check_in_time,
-                        'days_since_attendance': (datetime.utcnow() - last_attendance.check_in_time).days
-                    })
+    # Flag employees in a compiled kernel over int64 timestamps (NaT = missing)
+    count = len(employees)
+    registered = np.array(
+        [employee.registration_date for employee in employees], dtype='datetime64[us]'
+    ).astype(np.int64)
+    last_seen = np.array(
+        [last_attendance_map.get(employee.id) for employee in employees], dtype='datetime64[us]'
+    ).astype(np.int64)
+    active = np.fromiter((employee.status == 'active' for employee in employees), dtype=np.bool_, count=count)
+    flags = ghost_flags(registered, last_seen, active, np.datetime64(cutoff_date, 'us').astype(np.int64))
+    
+    # Whole days elapsed, as timedelta.days would give, in integer arithmetic
+    now_us = np.datetime64(now, 'us').astype(np.int64)
+    days_since_registration = (now_us - registered) // US_PER_DAY
+    days_since_attendance = (now_us - last_seen) // US_PER_DAY
+    
+    for i in np.flatnonzero(flags):
+        employee = employees[i]
+        # Check if no attendance or old attendance
+        if flags[i] == 1:
+            ghost_workers.append({
+                'employee': employee,
+                'reason': 'No attendance records',
+                'days_since_registration': int(days_since_registration[i])
+            })
+        else:
+            ghost_workers.append({
+                'employee': employee,
+                'reason': f'No attendance in {days_threshold} days',
+                'last_attendance': last_attendance_map[employee.id],
+                'days_since_attendance': int(days_since_attendance[i])
+            })
     
     return ghost_workers
 
 
-def detect_duplicate_claims(benefit_claims, time_window_hours=24):
+def detect_duplicate_claims(benefit_claims, time_window_hours=24, presorted=False):
     """
     Detect multiple benefit claims in short time period
     
     Args:
         benefit_claims: list of benefit claim records
         time_window_hours: time window to check for duplicates
+        presorted: True when the claims are already ordered by
+            (employee_id, claim_date), e.g. by the SQL query
     
     Returns:
         list of suspicious claim patterns
     """
     suspicious_claims = []
     
-    # Group claims by employee
-    claims_by_employee = defaultdict(list)
-    for claim in benefit_claims:
-        claims_by_employee[claim.employee_id].append(claim)
+    # One sort by employee then date puts each employee's claims side by side
+    claims = benefit_claims
+    if not presorted:
+        claims = sorted(benefit_claims, key=lambda x: (x.employee_id, x.claim_date))
     
-    for employee_id, claims in claims_by_employee.items():
-        # Sort by date
-        claims = sorted(claims, key=lambda x: x.claim_date)
-        
-        # Check for claims in short time windows
-        for i in range(len(claims) - 1):
-            time_diff = claims[i + 1].claim_date - claims[i].claim_date
-            hours_diff = time_diff.total_seconds() / 3600
-            
-            if hours_diff < time_window_hours:
-                suspicious_claims.append({
-                    'employee_id': employee_id,
-                    'claims': [claims[i], claims[i + 1]],
-                    'time_difference_hours': hours_diff,
-                    'reason': f'Multiple claims within {time_window_hours} hours'
-                })
+    if len(claims) < 2:
+        return suspicious_claims
+    
+    # Gaps between neighbours in integer microseconds, converted to hours
+    # exactly as timedelta.total_seconds() / 3600 would
+    employee_ids = np.fromiter((claim.employee_id for claim in claims), dtype=np.int64, count=len(claims))
+    claim_dates = np.array([claim.claim_date for claim in claims], dtype='datetime64[us]').astype(np.int64)
+    hours_diff = np.diff(claim_dates) / US_PER_SECOND / 3600
+    
+    # Check for claims in short time windows between neighbours
+    same_employee = employee_ids[1:] == employee_ids[:-1]
+    for i in np.flatnonzero(same_employee & (hours_diff < time_window_hours)):
+        suspicious_claims.append({
+            'employee_id': claims[i + 1].employee_id,
+            'claims': [claims[i], claims[i + 1]],
+            'time_difference_hours': float(hours_diff[i]),
+            'reason': f'Multiple claims within {time_window_hours} hours'
+        })
     
     return suspicious_claims
 
@@ -101,28 +146,42 @@ def detect_unusual_patterns(attendance_logs):
         list of unusual patterns (weekend check-ins, late night, etc.)
     """
     unusual_patterns = []
+    if not attendance_logs:
+        return unusual_patterns
     
-    for log in attendance_logs:
-        check_in = log.check_in_time
-        
-        # Check for weekend attendance (might be unusual for some organizations)
-        if check_in.weekday() >= 5:  # Saturday = 5, Sunday = 6
+    # Pull the fields out once, then flag every log with array comparisons
+    check_ins = np.array([log.check_in_time for log in attendance_logs], dtype='datetime64[s]')
+    days = check_ins.astype('datetime64[D]')
+    weekdays = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday; Monday = 0
+    hours = (check_ins - days).astype('timedelta64[h]').astype(np.int64)
+    confidence_scores = np.array(
+        [log.confidence_score or np.nan for log in attendance_logs], dtype=np.float64
+    )
+    
+    # Check for weekend attendance (might be unusual for some organizations)
+    weekend = weekdays >= 5  # Saturday = 5, Sunday = 6
+    # Check for late night/early morning (midnight to 5 AM)
+    unusual_hour = hours < 5
+    # Check for very low confidence scores (missing scores compare False)
+    low_confidence = confidence_scores < 70
+    
+    for i in np.flatnonzero(weekend | unusual_hour | low_confidence):
+        log = attendance_logs[i]
+        if weekend[i]:
             unusual_patterns.append({
                 'type': 'weekend_checkin',
                 'log': log,
                 'reason': 'Check-in on weekend'
             })
         
-        # Check for late night/early morning (midnight to 5 AM)
-        if check_in.hour < 5:
+        if unusual_hour[i]:
             unusual_patterns.append({
                 'type': 'unusual_hour',
                 'log': log,
-                'reason': f'Check-in at unusual hour: {check_in.hour}:00'
+                'reason': f'Check-in at unusual hour: {hours[i]}:00'
             })
         
-        # Check for very low confidence scores
-        if log.confidence_score and log. confidence_score < 70:
+        if low_confidence[i]:
             unusual_patterns.append({
                 'type': 'low_confidence',
                 'log': log,
@@ -139,12 +198,60 @@ def analyze_employee_risk(employee, attendance_logs, benefit_claims, duplicates)
     Returns:
         dict with risk_score (0-100) and risk_factors
     """
+    employee_duplicates = [d for d in duplicates if
+                          d.employee_id_1 == employee.id or d.employee_id_2 == employee.id]
+    employee_attendance = [log for log in attendance_logs if log.employee_id == employee.id]
+    employee_claims = [claim for claim in benefit_claims if claim.employee_id == employee.id]
+    
+    return _score_employee_risk(
+        employee, employee_attendance, employee_claims, employee_duplicates,
+        _days_since_registration([employee], datetime.utcnow())[0]
+    )
+
+
+def analyze_all_risks(employees, attendance_logs, benefit_claims, duplicates):
+    """
+    Calculate fraud risk for many employees at once
+    
+    Logs, claims and alerts are bucketed by employee in one pass each, so
+    this is linear in the input instead of rescanning it per employee.
+    
+    Returns:
+        list of analyze_employee_risk results, in employee order
+    """
+    attendance_by_employee = defaultdict(list)
+    for log in attendance_logs:
+        attendance_by_employee[log.employee_id].append(log)
+    
+    claims_by_employee = defaultdict(list)
+    for claim in benefit_claims:
+        claims_by_employee[claim.employee_id].append(claim)
+    
+    duplicates_by_employee = defaultdict(list)
+    for duplicate in duplicates:
+        duplicates_by_employee[duplicate.employee_id_1].append(duplicate)
+        if duplicate.employee_id_2 != duplicate.employee_id_1:
+            duplicates_by_employee[duplicate.employee_id_2].append(duplicate)
+    
+    days_since_registration = _days_since_registration(employees, datetime.utcnow())
+    return [
+        _score_employee_risk(
+            employee,
+            attendance_by_employee.get(employee.id, []),
+            claims_by_employee.get(employee.id, []),
+            duplicates_by_employee.get(employee.id, []),
+            days_since_reg
+        )
+        for employee, days_since_reg in zip(employees, days_since_registration)
+    ]
+
+
+def _score_employee_risk(employee, employee_attendance, employee_claims, employee_duplicates, days_since_reg):
+    """Risk score from one employee's own logs, claims and duplicate alerts"""
     risk_score = 0
     risk_factors = []
     
     # Check for duplicate alerts
-    employee_duplicates = [d for d in duplicates if 
-                          d.employee_id_1 == employee.id or d.employee_id_2 == employee.id]
     if employee_duplicates:
         pending_duplicates = [d for d in employee_duplicates if d.status == 'pending']
         if pending_duplicates:
@@ -152,15 +259,12 @@ def analyze_employee_risk(employee, attendance_logs, benefit_claims, duplicates)
             risk_factors.append(f'{len(pending_duplicates)} pending duplicate alerts')
     
     # Check attendance patterns
-    employee_attendance = [log for log in attendance_logs if log.employee_id == employee.id]
-    if len(employee_attendance) == 0 and employee.status == 'active':
-        days_since_reg = (datetime.utcnow() - employee.registration_date).days
+    if len(employee_attendance) == 0 and employee.status == 'active' and days_since_reg is not None:
         if days_since_reg > 7:
             risk_score += 30
             risk_factors.append(f'No attendance in {days_since_reg} days')
     
     # Check benefit claims
-    employee_claims = [claim for claim in benefit_claims if claim.employee_id == employee.id]
     unverified_claims = [c for c in employee_claims if not c.verified_by_biometric]
     if len(unverified_claims) > 0:
         risk_score += 20
@@ -0,0 +1,25 @@
+"""
+Fast JSON serialization for API responses
+"""
+from flask.json.provider import JSONProvider
+
+# Try to import orjson, fallback to Flask's default provider if not installed
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson (also serializes numpy values)"""
+
+    options = 0
+    if ORJSON_AVAILABLE:
+        options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.options).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
@@ -0,0 +1,106 @@
+"""
+Compiled numeric kernels for biometric matching
+"""
+import numpy as np
+
+# Try to import numba, fallback to the NumPy implementations if not installed
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """No-op stand-in so the kernels below still import without numba"""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+# datetime64 NaT (a missing timestamp) viewed as int64
+NAT = np.iinfo(np.int64).min
+
+
+@njit(cache=True, fastmath=True)
+def euclidean_distance(a, b):
+    """Euclidean distance between two encodings"""
+    total = 0.0
+    for i in range(a.shape[0]):
+        diff = a[i] - b[i]
+        total += diff * diff
+    return np.sqrt(total)
+
+
+@njit(cache=True, fastmath=True)
+def row_distances(matrix, vector):
+    """
+    Euclidean distance from one encoding to every row of an (N, D) matrix
+    Serial on purpose: it runs on request threads, and numba's workqueue
+    threading layer aborts the process on concurrent parallel calls.
+    """
+    n = matrix.shape[0]
+    out = np.empty(n, dtype=np.float32)
+    for i in range(n):
+        out[i] = euclidean_distance(matrix[i], vector)
+    return out
+
+
+@njit(cache=True)
+def int8_dots(codes, query):
+    """
+    Dot products of int8 query codes with every row of an (N, D) int8 matrix
+    Accumulates in int32, like np.einsum(..., dtype=np.int32), without
+    first widening the whole matrix
+    """
+    n, d = codes.shape
+    out = np.empty(n, dtype=np.int32)
+    for i in range(n):
+        total = 0
+        for j in range(d):
+            total += np.int32(codes[i, j]) * np.int32(query[j])
+        out[i] = total
+    return out
+
+
+@njit(cache=True, fastmath=True)
+def paired_distances(a, b):
+    """
+    Euclidean distance between matching rows of two (N, D) matrices
+    Serial on purpose: verify batches are small and run on the streamer's
+    background thread, where the parallel backend stalls interpreter exit.
+    """
+    n = a.shape[0]
+    out = np.empty(n, dtype=np.float32)
+    for i in range(n):
+        out[i] = euclidean_distance(a[i], b[i])
+    return out
+
+
+@njit(cache=True)
+def ghost_flags(registered, last_seen, active, cutoff):
+    """
+    Classify employees for detect_ghost_workers from int64 timestamps
+    Serial for the same reason as row_distances: it is called on request threads.
+    Returns: int8 per employee, 0 = fine, 1 = no attendance, 2 = no recent attendance
+    """
+    n = registered.shape[0]
+    out = np.zeros(n, dtype=np.int8)
+    for i in range(n):
+        if active[i] and registered[i] != NAT and registered[i] < cutoff:
+            if last_seen[i] == NAT:
+                out[i] = 1
+            elif last_seen[i] < cutoff:
+                out[i] = 2
+    return out
+
+
+def warm_up():
+    """Compile the kernels the request paths use ahead of the first request"""
+    if not NUMBA_AVAILABLE:
+        return
+    codes = np.zeros((2, 128), dtype=np.int8)
+    int8_dots(codes, codes[0])
+    matrix = np.zeros((2, 128), dtype=np.float32)
+    paired_distances(matrix, matrix)
+    timestamps = np.zeros(2, dtype=np.int64)
+    ghost_flags(timestamps, timestamps, np.ones(2, dtype=np.bool_), 0)